@@ -0,0 +1,114 @@
+"""
+Benchmark: analytics overview, per-group rows vs the single-pass $facet
+
+Seeds a scratch database with ORDERS orders (default 1,000,000) spread over a
+year and eight categories. Then it times the raw /analytics/overview
+aggregation two ways: the old day x category $group with an $addToSet of order
+ids, finished in Python, and main.overview_pipeline. It also reports how much
+BSON each one sends back.
+
+Usage:
+    DATABASE_URL=mongodb://localhost:27017 python benchmarks/bench_analytics_facet.py
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import bson
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ["DATABASE_NAME"] = "bench_analytics_facet"
+
+import main  # noqa: E402
+from database import db  # noqa: E402
+from denormalize import add_totals  # noqa: E402
+
+ORDERS = int(os.getenv("ORDERS", 1_000_000))
+BATCH = 10_000
+CATEGORIES = ["subscriptions", "hardware", "services", "training", "support", "licenses", "addons", "other"]
+
+GROUPED = [
+    {"$unwind": "$items"},
+    {"$addFields": {"line_total": {"$multiply": ["$items.quantity", "$items.price"]}}},
+    {"$group": {
+        "_id": {
+            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$order_date"}},
+            "category": "$items.category",
+        },
+        "sales": {"$sum": "$line_total"},
+        "orders": {"$addToSet": "$_id"},
+    }},
+]
+
+
+def seed():
+    start = datetime(2025, 1, 1)
+    batch = []
+    for i in range(ORDERS):
+        items = [
+            {"product_id": "p", "quantity": random.randint(1, 5), "price": random.choice([9.5, 20.0, 49.0, 99.0]),
+             "category": random.choice(CATEGORIES)}
+            for _ in range(random.randint(1, 4))
+        ]
+        batch.append(add_totals({"items": items, "order_date": start + timedelta(seconds=random.randrange(365 * 86400))}))
+        if len(batch) == BATCH:
+            db["order"].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db["order"].insert_many(batch, ordered=False)
+
+
+def grouped_overview(filt: dict):
+    rows = list(db["order"].aggregate([{"$match": filt}] + GROUPED, allowDiskUse=True))
+    cat_map, trend_map = {}, {}
+    for r in rows:
+        cat = r["_id"].get("category") or "Unknown"
+        day = r["_id"]["day"]
+        cat_map[cat] = cat_map.get(cat, 0) + r["sales"]
+        trend_map[day] = trend_map.get(day, 0) + r["sales"]
+    orders_count = len({oid for r in rows for oid in r["orders"]})
+    response = main.build_analytics_response(sum(r["sales"] for r in rows), orders_count, cat_map, trend_map)
+    return response, sum(len(bson.encode(r)) for r in rows)
+
+
+def facet_overview(filt: dict):
+    facet = list(db["order"].aggregate(main.overview_pipeline(filt), allowDiskUse=True))[0]
+    totals = facet["totals"][0]
+    response = main.build_analytics_response(
+        totals["sales"], totals["orders"],
+        {c["_id"]: c["sales"] for c in facet["categories"]},
+        {d["_id"]: d["sales"] for d in facet["trend"]},
+    )
+    return response, len(bson.encode(facet))
+
+
+def timed(fn, filt, runs: int = 3):
+    began = time.perf_counter()
+    for _ in range(runs):
+        response, size = fn(filt)
+    return response, size, (time.perf_counter() - began) / runs
+
+
+if __name__ == "__main__":
+    db.client.drop_database(db.name)
+    seed()
+    ranges = {
+        "all": {},
+        "1 month": {"order_date": {"$gte": datetime(2025, 6, 1), "$lt": datetime(2025, 7, 1)}},
+        "category": {"items.category": "hardware"},
+    }
+    print(f"{'range':>10} {'pipeline':>9} {'seconds':>8} {'bytes':>12}")
+    for label, filt in ranges.items():
+        results = []
+        for name, fn in (("grouped", grouped_overview), ("facet", facet_overview)):
+            response, size, elapsed = timed(fn, filt)
+            results.append(response)
+            print(f"{label:>10} {name:>9} {elapsed:>8.3f} {size:>12,}")
+        # Float sums can differ in the last place depending on summation order
+        a, b = results
+        assert a.orders_count == b.orders_count and abs(a.total_sales - b.total_sales) < 0.01
+    db.client.drop_database(db.name)
@@ -0,0 +1,59 @@
+"""
+Benchmark: sync (threadpool) vs async (Motor) database helpers
+
+Fires CONCURRENCY simultaneous reads against a local mongod, once through the
+sync helpers dispatched to AnyIO's worker threads (what a plain `def`
+endpoint does) and once through the async helpers awaited on the event loop
+(what the `async def` endpoints do), and reports requests per second.
+
+Usage:
+    DATABASE_URL=mongodb://localhost:27017 python benchmarks/bench_async_vs_sync.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import anyio.to_thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ["DATABASE_NAME"] = "bench_async_vs_sync"
+
+from database import db, get_documents, aget_documents  # noqa: E402
+
+REQUESTS = 5000
+CONCURRENCY = 500
+
+
+def seed(n: int = 50):
+    db["product"].drop()
+    db["product"].insert_many([
+        {"title": f"Product {i}", "price": float(i), "category": "bench"} for i in range(n)
+    ])
+
+
+async def run(label: str, call):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:>6}: {REQUESTS / elapsed:>9.0f} req/s ({elapsed:.2f}s)")
+
+
+async def main():
+    await run("sync", lambda: anyio.to_thread.run_sync(get_documents, "product", {"category": "bench"}, 20))
+    await run("async", lambda: aget_documents("product", {"category": "bench"}, 20))
+
+
+if __name__ == "__main__":
+    seed()
+    print(f"{REQUESTS} reads, {CONCURRENCY} in flight")
+    asyncio.run(main())
+    db.client.drop_database(db.name)
@@ -0,0 +1,127 @@
+"""
+Benchmark: columnar analytics engine vs the Mongo $facet pipeline
+
+Seeds a scratch database with ORDERS orders (default 1,000,000), loads the
+columnar engine from it, then runs the same random date ranges and category
+filters through both. It reports the latency of each and fails if any
+response differs. Sales are compared to the cent, because the two sum in
+different orders. Needs numpy.
+
+Usage:
+    DATABASE_URL=mongodb://localhost:27017 python benchmarks/bench_columnar.py
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ["DATABASE_NAME"] = "bench_columnar"
+os.environ["ANALYTICS_ENGINE"] = "columnar"
+
+import columnar  # noqa: E402
+import main  # noqa: E402
+from database import db  # noqa: E402
+from denormalize import add_totals  # noqa: E402
+
+ORDERS = int(os.getenv("ORDERS", 1_000_000))
+QUERIES = int(os.getenv("QUERIES", 50))
+BATCH = 10_000
+START = datetime(2025, 1, 1)
+CATEGORIES = ["subscriptions", "hardware", "services", "training", "support", "licenses", "addons", None]
+
+
+def seed():
+    batch = []
+    for _ in range(ORDERS):
+        items = []
+        for _ in range(random.randint(1, 4)):
+            item = {"product_id": "p", "quantity": random.randint(1, 5), "price": random.choice([9.5, 20.0, 49.0, 99.0])}
+            category = random.choice(CATEGORIES)
+            if category is not None:
+                item["category"] = category
+            items.append(item)
+        batch.append(add_totals({"items": items, "order_date": START + timedelta(seconds=random.randrange(365 * 86400))}))
+        if len(batch) == BATCH:
+            db["order"].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db["order"].insert_many(batch, ordered=False)
+
+
+def random_query():
+    start = START + timedelta(minutes=random.randrange(365 * 1440)) if random.random() < 0.8 else None
+    end = start + timedelta(days=random.randint(1, 90)) if start and random.random() < 0.8 else None
+    category = random.choice(CATEGORIES + [None, None]) if random.random() < 0.5 else None
+    return start, end, category
+
+
+def mongo_overview(start, end, category):
+    filt = {}
+    if start or end:
+        filt["order_date"] = {op: v for op, v in (("$gte", start), ("$lte", end)) if v is not None}
+    if category:
+        filt["items.category"] = category
+    facet = list(db["order"].aggregate(main.overview_pipeline(filt), allowDiskUse=True))[0]
+    totals = (facet["totals"] or [{}])[0]
+    return main.build_analytics_response(
+        float(totals.get("sales", 0)), int(totals.get("orders", 0)),
+        {c["_id"]: float(c["sales"]) for c in facet["categories"]},
+        {d["_id"]: float(d["sales"]) for d in facet["trend"]},
+    )
+
+
+def columnar_overview(start, end, category):
+    summary = columnar.overview(start, end, category)
+    return main.build_analytics_response(
+        summary["total_sales"], summary["orders_count"], summary["cat_map"], summary["trend_map"]
+    )
+
+
+def same(a, b) -> bool:
+    def close(x, y):
+        return abs(x - y) <= 0.011
+    return (
+        a.orders_count == b.orders_count
+        and close(a.total_sales, b.total_sales)
+        and [c["category"] for c in a.top_categories] == [c["category"] for c in b.top_categories]
+        and all(close(x["sales"], y["sales"]) for x, y in zip(a.top_categories, b.top_categories))
+        and [d["date"] for d in a.trend] == [d["date"] for d in b.trend]
+        and all(close(x["sales"], y["sales"]) for x, y in zip(a.trend, b.trend))
+    )
+
+
+def timed(fn, *args):
+    began = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - began) * 1000
+
+
+if __name__ == "__main__":
+    db.client.drop_database(db.name)
+    seed()
+    began = time.perf_counter()
+    columnar.load()
+    print(f"loaded {ORDERS:,} orders in {time.perf_counter() - began:.1f}s: {columnar.stats()}")
+
+    timings = {"mongo": [], "columnar": []}
+    mismatches = 0
+    for _ in range(QUERIES):
+        query = random_query()
+        expected, mongo_ms = timed(mongo_overview, *query)
+        actual, columnar_ms = timed(columnar_overview, *query)
+        timings["mongo"].append(mongo_ms)
+        timings["columnar"].append(columnar_ms)
+        if not same(expected, actual):
+            mismatches += 1
+            print("mismatch", query, expected, actual)
+
+    print(f"{'engine':>9} {'p50 ms':>8} {'max ms':>8}")
+    for name, values in timings.items():
+        print(f"{name:>9} {statistics.median(values):>8.2f} {max(values):>8.2f}")
+    db.client.drop_database(db.name)
+    assert mismatches == 0, f"{mismatches} of {QUERIES} queries differ"
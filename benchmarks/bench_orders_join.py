@@ -0,0 +1,73 @@
+"""
+Benchmark: GET /orders customer join
+
+Seeds a scratch database with N orders spread over a pool of customers and
+counts the Mongo commands issued by list_orders. The round-trip count should
+stay constant as N grows.
+
+Usage:
+    DATABASE_URL=mongodb://localhost:27017 python benchmarks/bench_orders_join.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ["DATABASE_NAME"] = "bench_orders_join"
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+import main  # noqa: E402
+from fastapi import Request  # noqa: E402
+from database import db  # noqa: E402
+
+
+def seed(n_orders: int, n_customers: int = 200):
+    db["customer"].drop()
+    db["order"].drop()
+    customer_ids = db["customer"].insert_many(
+        [{"name": f"Customer {i}", "email": f"c{i}@example.com"} for i in range(n_customers)]
+    ).inserted_ids
+    db["order"].insert_many([
+        {
+            "customer_id": str(customer_ids[i % n_customers]),
+            "items": [{"product_id": "p1", "quantity": 1, "price": 10.0}],
+            "status": "paid",
+        }
+        for i in range(n_orders)
+    ])
+
+
+if __name__ == "__main__":
+    print(f"{'orders':>8} {'commands':>9} {'seconds':>8}")
+    for n in (100, 1000, 5000):
+        seed(n)
+        counter.count = 0
+        start = time.perf_counter()
+        response = asyncio.run(main.list_orders(Request({"type": "http", "headers": []})))
+        elapsed = time.perf_counter() - start
+        assert len(json.loads(response.body)) == n
+        print(f"{n:>8} {counter.count:>9} {elapsed:>8.3f}")
+    db.client.drop_database(db.name)
@@ -0,0 +1,70 @@
+"""
+Microbenchmark: document serialization
+
+Encodes 10k order-shaped documents with the previous path (copying
+serialize_doc + jsonable_encoder + json.dumps, as FastAPI did by default)
+and with serializers.serialize_doc + orjson. No database needed.
+
+Usage:
+    python benchmarks/bench_serializer.py
+"""
+
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from serializers import dumps, serialize_doc  # noqa: E402
+
+N_DOCS = 10_000
+ROUNDS = 5
+
+
+def legacy_serialize_doc(doc: dict):
+    if not doc:
+        return doc
+    d = {**doc}
+    if "_id" in d:
+        d["id"] = str(d.pop("_id"))
+    for k, v in list(d.items()):
+        if isinstance(v, datetime):
+            d[k] = v.isoformat()
+    return d
+
+
+def make_docs():
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "customer_id": str(ObjectId()),
+            "items": [{"product_id": str(ObjectId()), "quantity": 2, "price": 19.99} for _ in range(3)],
+            "status": "paid",
+            "order_date": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for _ in range(N_DOCS)
+    ]
+
+
+def legacy():
+    return json.dumps(jsonable_encoder([legacy_serialize_doc(d) for d in make_docs()])).encode()
+
+
+def fast():
+    return dumps([serialize_doc(d) for d in make_docs()])
+
+
+if __name__ == "__main__":
+    # Document construction is included in both timings; measure it on its own to subtract
+    base = min(timeit.repeat(make_docs, number=1, repeat=ROUNDS))
+    for label, fn in (("legacy", legacy), ("orjson", fast)):
+        best = min(timeit.repeat(fn, number=1, repeat=ROUNDS)) - base
+        print(f"{label:>7}: {best * 1000:8.1f} ms per {N_DOCS} docs")
@@ -0,0 +1,80 @@
+"""
+Benchmark: tracking events in a regular vs a time-series collection
+
+Inserts the same page-view events into a regular collection and into the
+page_views time-series collection, created by database.ensure_collection()
+from its declared spec (timeField=timestamp, metaField=page_path) as the
+tracking helpers do. Then it times a one-hour range query for a single page
+and reports storage size. Needs MongoDB 5.0+.
+
+Usage:
+    DATABASE_URL=mongodb://localhost:27017 python benchmarks/bench_time_series.py
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ["DATABASE_NAME"] = "bench_time_series"
+# The events are dated 2025; a TTL would expire them mid-run
+os.environ.pop("TRACKING_TTL_SECONDS", None)
+
+from database import db, ensure_collection  # noqa: E402
+
+EVENTS = 500_000
+BATCH = 5000
+PAGES = [f"/page/{i}" for i in range(200)]
+
+
+def make_events(start: datetime):
+    for i in range(EVENTS):
+        yield {
+            "page_path": random.choice(PAGES),
+            "user_id": f"u{random.randrange(10_000)}",
+            "timestamp": start + timedelta(seconds=i * 0.5),
+        }
+
+
+def load(collection):
+    start = datetime(2025, 1, 1)
+    batch = []
+    began = time.perf_counter()
+    for event in make_events(start):
+        batch.append(event)
+        if len(batch) == BATCH:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    return EVENTS / (time.perf_counter() - began)
+
+
+def range_query(collection, runs: int = 20):
+    lo = datetime(2025, 1, 2, 12)
+    query = {"page_path": "/page/7", "timestamp": {"$gte": lo, "$lt": lo + timedelta(hours=1)}}
+    began = time.perf_counter()
+    for _ in range(runs):
+        list(collection.find(query))
+    return (time.perf_counter() - began) / runs * 1000
+
+
+if __name__ == "__main__":
+    db.client.drop_database(db.name)
+    regular = db["page_views_regular"]
+    regular.create_index([("page_path", 1), ("timestamp", 1)])
+    ensure_collection("page_views")
+    info = next(db.list_collections(filter={"name": "page_views"}), {})
+    assert info.get("type") == "timeseries", "page_views was not created as a time-series collection"
+    series = db["page_views"]
+
+    print(f"{'layout':>12} {'inserts/s':>10} {'range ms':>9} {'storage MB':>11}")
+    for label, collection in (("regular", regular), ("time-series", series)):
+        rate = load(collection)
+        latency = range_query(collection)
+        size = db.command("collStats", collection.name).get("storageSize", 0) / 1e6
+        print(f"{label:>12} {rate:>10.0f} {latency:>9.2f} {size:>11.1f}")
+    db.client.drop_database(db.name)
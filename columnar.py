@@ -0,0 +1,296 @@
+"""
+Columnar Analytics Engine
+
+Optional in-memory engine for /analytics/overview, enabled with
+ANALYTICS_ENGINE=columnar (needs NumPy). Every order item is one row in a set
+of NumPy columns: order timestamp (ms), day ordinal, category code, line total
+and order code. A query is then a few vectorized masks plus bincount
+group-bys, so it doesn't touch Mongo at all.
+
+load() fills the columns from the orders collection (synchronously, meant for
+a background thread); overview() returns None until it has finished, and the
+caller falls back to the rollups / Mongo pipeline. The order write paths in
+main.py call apply_orders() with the orders they removed and added, next to the
+rollup update. Writes that arrive while loading are replayed afterwards, and
+applying an order replaces whatever rows it had, so replays are harmless.
+Writes made before any load started are dropped (the load reads them from
+Mongo), and a failed load is retried a few times with backoff, then given up.
+
+Results follow main.overview_pipeline: orders without items or without an
+order_date count for nothing, and a category filter keeps whole orders.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from database import db
+from rollups import order_day
+
+logger = logging.getLogger(__name__)
+
+ENGINE = os.getenv("ANALYTICS_ENGINE", "mongo")
+LOAD_BATCH_SIZE = 5000
+LOAD_ATTEMPTS = 3
+LOAD_RETRY_SECONDS = 30  # doubled after each failed attempt
+LOAD_PROJECTION = {"order_date": 1, "items.category": 1, "items.line_total": 1, "items.quantity": 1, "items.price": 1}
+# Compact once at least this many rows (and half of all rows) belong to replaced or deleted orders
+COMPACT_MIN_DEAD = 10000
+
+_EPOCH = datetime(1970, 1, 1)
+_MS = timedelta(milliseconds=1)
+_COLUMNS = (("ts", "int64"), ("day", "int32"), ("category", "int32"), ("line", "float64"), ("order", "int64"))
+
+
+def _ms(value: datetime) -> int:
+    """Milliseconds since the epoch, truncated like BSON dates (naive values are UTC)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MS
+
+
+class _Columns:
+    """Growable column arrays plus the order -> row range index; not thread-safe"""
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.dead = 0
+        self.cols = {name: np.empty(capacity, dtype) for name, dtype in _COLUMNS}
+        self.live = np.zeros(capacity, bool)
+        self.rows = {}  # order id -> (start, stop)
+        self.order_codes = {}  # order id -> order code
+        self.categories = []  # code -> raw category value (None included)
+        self.category_codes = {}
+
+    def _reserve(self, extra: int):
+        capacity = len(self.live)
+        if self.size + extra <= capacity:
+            return
+        capacity = max(capacity * 2, self.size + extra)
+        for name, col in self.cols.items():
+            grown = np.empty(capacity, col.dtype)
+            grown[:self.size] = col[:self.size]
+            self.cols[name] = grown
+        live = np.zeros(capacity, bool)
+        live[:self.size] = self.live[:self.size]
+        self.live = live
+
+    def _category_code(self, category) -> int:
+        code = self.category_codes.get(category)
+        if code is None:
+            code = self.category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def remove(self, order_id: str):
+        span = self.rows.pop(order_id, None)
+        if span is not None:
+            start, stop = span
+            self.live[start:stop] = False
+            self.dead += stop - start
+
+    def add(self, order: dict):
+        order_id = str(order["_id"])
+        self.remove(order_id)
+        items = order.get("items") or []
+        order_date = order.get("order_date")
+        if not items or order_date is None:
+            return
+        ts = _ms(order_date)
+        day = date.fromisoformat(order_day(order_date)).toordinal()
+        code = self.order_codes.setdefault(order_id, len(self.order_codes))
+        self._reserve(len(items))
+        start = self.size
+        for i, item in enumerate(items, start):
+            line_total = item.get("line_total")
+            if line_total is None:
+                line_total = (item.get("quantity") or 0) * (item.get("price") or 0)
+            self.cols["ts"][i] = ts
+            self.cols["day"][i] = day
+            self.cols["category"][i] = self._category_code(item.get("category"))
+            self.cols["line"][i] = line_total
+            self.cols["order"][i] = code
+        self.size = start + len(items)
+        self.live[start:self.size] = True
+        self.rows[order_id] = (start, self.size)
+        if self.dead >= COMPACT_MIN_DEAD and self.dead * 2 >= self.size:
+            self.compact()
+
+    def compact(self):
+        """Drop the rows of removed orders and renumber order codes"""
+        n = self.size
+        keep = self.live[:n]
+        new_start = np.cumsum(keep) - keep
+        order_codes = {}
+        rows = {}
+        old_codes = self.cols["order"][:n][keep]
+        for order_id, (start, stop) in self.rows.items():
+            rows[order_id] = (int(new_start[start]), int(new_start[start]) + stop - start)
+            order_codes[order_id] = len(order_codes)
+        remap = np.full(len(self.order_codes), -1, np.int64)
+        for order_id, code in order_codes.items():
+            remap[self.order_codes[order_id]] = code
+        for name, col in self.cols.items():
+            col[:keep.sum()] = col[:n][keep]
+        self.size = int(keep.sum())
+        self.cols["order"][:self.size] = remap[old_codes]
+        self.live[:] = False
+        self.live[:self.size] = True
+        self.rows, self.order_codes, self.dead = rows, order_codes, 0
+
+    def overview(self, start: Optional[datetime], end: Optional[datetime], category) -> dict:
+        n = self.size
+        cols = {name: col[:n] for name, col in self.cols.items()}
+        mask = self.live[:n].copy()
+        if start is not None:
+            mask &= cols["ts"] >= _ms(start)
+        if end is not None:
+            mask &= cols["ts"] <= _ms(end)
+        if category is not None:
+            code = self.category_codes.get(category)
+            hit = np.zeros(len(self.order_codes), bool)
+            if code is not None:
+                hit[cols["order"][mask & (cols["category"] == code)]] = True
+            mask &= hit[cols["order"]]
+
+        sales = cols["line"][mask]
+        orders = cols["order"][mask]
+        cat_sales = np.bincount(cols["category"][mask], weights=sales, minlength=len(self.categories))
+        cat_rows = np.bincount(cols["category"][mask], minlength=len(self.categories))
+        cat_map = {}
+        for code in np.flatnonzero(cat_rows):
+            label = self.categories[code]
+            label = "Unknown" if label is None else label
+            cat_map[label] = cat_map.get(label, 0) + float(cat_sales[code])
+        trend_map = {}
+        if sales.size:
+            days = cols["day"][mask]
+            first = int(days.min())
+            day_sales = np.bincount(days - first, weights=sales)
+            day_rows = np.bincount(days - first)
+            trend_map = {
+                date.fromordinal(first + int(offset)).isoformat(): float(day_sales[offset])
+                for offset in np.flatnonzero(day_rows)
+            }
+        return {
+            "total_sales": float(sales.sum()),
+            "orders_count": int(np.count_nonzero(np.bincount(orders))) if orders.size else 0,
+            "cat_map": cat_map,
+            "trend_map": trend_map,
+        }
+
+
+class ColumnarOrders:
+    def __init__(self):
+        self.ready = False
+        self.loaded_at = None
+        self._columns = _Columns()
+        self._pending = None  # writes to replay while a load is running
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Rebuild the columns from Mongo, then replay writes made meanwhile (blocking)"""
+        with self._lock:
+            self._pending = []
+        columns = _Columns()
+        try:
+            for order in db["order"].find({}, LOAD_PROJECTION).batch_size(LOAD_BATCH_SIZE):
+                columns.add(order)
+        except Exception:
+            with self._lock:
+                # Keep serving the previous columns, if any, and stop queueing writes
+                if self.ready:
+                    for removed, added in self._pending:
+                        _apply(self._columns, removed, added)
+                self._pending = None
+            raise
+        with self._lock:
+            for removed, added in self._pending:
+                _apply(columns, removed, added)
+            self._columns, self._pending = columns, None
+            self.ready = True
+            self.loaded_at = datetime.now(timezone.utc)
+
+    def apply_orders(self, removed: list, added: list):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((removed, added))
+            elif self.ready:
+                _apply(self._columns, removed, added)
+
+    def overview(self, start, end, category) -> Optional[dict]:
+        if not self.ready:
+            return None
+        with self._lock:
+            return self._columns.overview(start, end, category)
+
+    def stats(self) -> dict:
+        with self._lock:
+            columns = self._columns
+            return {
+                "ready": self.ready,
+                "loaded_at": self.loaded_at,
+                "rows": columns.size - columns.dead,
+                "dead_rows": columns.dead,
+                "orders": len(columns.rows),
+                "categories": len(columns.categories),
+                "bytes": sum(col.nbytes for col in columns.cols.values()) + columns.live.nbytes,
+            }
+
+
+def _apply(columns: _Columns, removed: list, added: list):
+    for order in removed:
+        if order:
+            columns.remove(str(order["_id"]))
+    for order in added:
+        if order:
+            columns.add(order)
+
+
+if ENGINE == "columnar" and np is None:
+    logger.warning("ANALYTICS_ENGINE=columnar needs numpy; using the Mongo pipeline")
+engine = ColumnarOrders() if ENGINE == "columnar" and np is not None else None
+
+
+def load():
+    """Load the engine, retrying with backoff; logs and gives up after LOAD_ATTEMPTS"""
+    if engine is None or db is None:
+        return
+    for attempt in range(1, LOAD_ATTEMPTS + 1):
+        try:
+            engine.load()
+            return
+        except Exception:
+            logger.exception("Columnar load failed (attempt %d of %d)", attempt, LOAD_ATTEMPTS)
+            if attempt < LOAD_ATTEMPTS:
+                time.sleep(LOAD_RETRY_SECONDS * 2 ** (attempt - 1))
+
+
+def reload():
+    """Stop serving and load again in a background thread (after a failed update)"""
+    if engine is not None and db is not None:
+        engine.ready = False
+        threading.Thread(target=load, daemon=True).start()
+
+
+def apply_orders(removed: list, added: list):
+    """Replace the rows of changed orders: `removed` before the write, `added` after it"""
+    if engine is not None:
+        engine.apply_orders(removed, added)
+
+
+def overview(start: Optional[datetime], end: Optional[datetime], category: Optional[str]) -> Optional[dict]:
+    """Totals, categories and trend like rollups.overview, or None when the engine isn't serving"""
+    return engine.overview(start, end, category) if engine is not None else None
+
+
+def stats() -> dict:
+    return {"engine": "columnar" if engine is not None else "mongo", **(engine.stats() if engine else {})}
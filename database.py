@@ -5,11 +5,20 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, UpdateOne, UpdateMany, DeleteOne, monitoring
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson import Decimal128, ObjectId
+from bson import json_util
 from datetime import datetime, timezone
 import os
+import re
+import time
+import unicodedata
+import base64
+import threading
 from dotenv import load_dotenv
-from typing import Union
+from typing import Optional, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
@@ -17,39 +26,688 @@ load_dotenv()
 
 _client = None
 db = None
+# Async (Motor) handle on the same database, used by the async def endpoints
+_async_client = None
+async_db = None
 
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+def client_options(sync: bool = False) -> dict:
+    """MongoClient pool/timeout settings from MONGO_* environment variables
+
+    Unset variables fall back to the driver default, except the connect and
+    server selection timeouts which default to 5s so an unreachable server
+    fails fast instead of stalling requests for 30s.
+
+    The pool sizes apply to the Motor client that serves requests. The sync
+    client (sync=True) is only used by background threads (backfills, rollup
+    rebuilds, ingest) and gets its own, smaller pool: MONGO_SYNC_MAX_POOL_SIZE,
+    default 10, with no minimum.
+    """
+    options = {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE"),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE"),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_TIME_MS"),
+        "waitQueueTimeoutMS": _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "socketTimeoutMS": _env_int("MONGO_SOCKET_TIMEOUT_MS"),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        # e.g. "zstd,snappy,zlib"; zstd needs `zstandard`, snappy needs `python-snappy`
+        "compressors": os.getenv("MONGO_COMPRESSORS") or None,
+    }
+    if sync:
+        options["maxPoolSize"] = _env_int("MONGO_SYNC_MAX_POOL_SIZE", 10)
+        options["minPoolSize"] = None
+    return {k: v for k, v in options.items() if v is not None}
+
+class PoolWaitMetrics(monitoring.ConnectionPoolListener):
+    """Records how long operations wait to check a connection out of the pool"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.failures = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.failures,
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+            }
+
+    # Check-out started/finished fire on the same thread, so a thread-local start time pairs them
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        if started is None:
+            return
+        wait_ms = (time.perf_counter() - started) * 1000
+        self._local.started = None
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_check_out_failed(self, event):
+        self._local.started = None
+        with self._lock:
+            self.failures += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+pool_metrics = PoolWaitMetrics()
+
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    _client = MongoClient(database_url, event_listeners=[pool_metrics], **client_options(sync=True))
     db = _client[database_name]
+    _async_client = AsyncIOMotorClient(database_url, event_listeners=[pool_metrics], **client_options())
+    async_db = _async_client[database_name]
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+DATABASE_UNAVAILABLE = "Database not available. Check DATABASE_URL and DATABASE_NAME environment variables."
+
+# Collections stored as MongoDB time-series collections (MongoDB 5.0+), keyed
+# by name. They are created by ensure_collection() before first use; an
+# existing regular collection with the same name is left as it is.
+TIME_SERIES_COLLECTIONS = {}
+_ensured_collections = set()
+
+def declare_time_series(collection_name: str, time_field: str, meta_field: str = None,
+                        granularity: str = "seconds", expire_after_seconds: int = None):
+    """Register a collection to be created as a time-series collection"""
+    options = {"timeField": time_field, "granularity": granularity}
+    if meta_field:
+        options["metaField"] = meta_field
+    TIME_SERIES_COLLECTIONS[collection_name] = {
+        "timeseries": options,
+        "expireAfterSeconds": expire_after_seconds,
+    }
+
+def ensure_collection(collection_name: str):
+    """Create a declared time-series collection if it doesn't exist yet (blocking, cached per process)"""
+    if db is None or collection_name in _ensured_collections:
+        return
+    spec = TIME_SERIES_COLLECTIONS.get(collection_name)
+    if spec is not None and collection_name not in db.list_collection_names(filter={"name": collection_name}):
+        kwargs = {"timeseries": spec["timeseries"]}
+        if spec["expireAfterSeconds"]:
+            kwargs["expireAfterSeconds"] = spec["expireAfterSeconds"]
+        try:
+            db.create_collection(collection_name, **kwargs)
+        except CollectionInvalid:
+            pass  # created concurrently
+        except OperationFailure:
+            pass  # server without time-series support; inserts create a regular collection
+    _ensured_collections.add(collection_name)
+
+# Tracking events from schema_examples.py, bucketed per user / per page
+declare_time_series("user_activities", "timestamp", meta_field="user_id",
+                    expire_after_seconds=_env_int("TRACKING_TTL_SECONDS"))
+declare_time_series("page_views", "timestamp", meta_field="page_path",
+                    expire_after_seconds=_env_int("TRACKING_TTL_SECONDS"))
+
+# Every write helper below reports through _record_write(): per
+# "collection.operation" counts and timings in write_stats, then each hook
+# registered with register_write_hook() (e.g. cache invalidation).
+write_stats = {}
+_write_hooks = []
+_write_stats_lock = threading.Lock()
+
+def register_write_hook(hook):
+    """Call hook(collection_name, operation) after every write made through these helpers
+
+    Hooks run on the writing thread, which is not always the event loop (the
+    sync helpers are used from background threads), so they must be thread-safe.
+    """
+    _write_hooks.append(hook)
+
+def _record_write(collection_name: str, operation: str, started: float):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _write_stats_lock:
+        stats = write_stats.setdefault(f"{collection_name}.{operation}", {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+    for hook in _write_hooks:
+        hook(collection_name, operation)
+
+def _object_ids(document_ids: list) -> list:
+    return [ObjectId(document_id) for document_id in document_ids]
 
+# Helper functions for common database operations
+def _to_dict(data: Union[BaseModel, dict]) -> dict:
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
-        data_dict = data.model_dump()
-    else:
-        data_dict = data.copy()
+        return data.model_dump()
+    return data.copy()
+
+# Collections with a searchable display field. A normalized copy is kept in a
+# `_search` sub-document on every write so prefix searches can use an index:
+#   {"name": "<whole value>", "terms": ["<word>", ...]}
+SEARCH_FIELDS = {"customer": "name", "product": "title"}
+# Most documents the word-prefix step of a search looks at (see asearch_documents)
+SEARCH_CANDIDATES = _env_int("SEARCH_CANDIDATES", 500)
+
+def normalize_search_text(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace"""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+def _search_fields(collection_name: str, data_dict: dict) -> Optional[dict]:
+    field = SEARCH_FIELDS.get(collection_name)
+    if field is None or data_dict.get(field) is None:
+        return None
+    name = normalize_search_text(data_dict[field])
+    return {"name": name, "terms": sorted(set(name.split()))}
 
+def _prepare_document(collection_name: str, data: Union[BaseModel, dict]) -> dict:
+    data_dict = _to_dict(data)
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
+    data_dict['version'] = 1
+    search = _search_fields(collection_name, data_dict)
+    if search is not None:
+        data_dict['_search'] = search
+    return data_dict
+
+def _prepare_update(collection_name: str, data: Union[BaseModel, dict]) -> dict:
+    data_dict = _to_dict(data)
+    data_dict['updated_at'] = datetime.now(timezone.utc)
+    search = _search_fields(collection_name, data_dict)
+    if search is not None:
+        data_dict['_search'] = search
+    return data_dict
+
+def _update_spec(collection_name: str, data: Union[BaseModel, dict]) -> dict:
+    """$set the fields (stamping updated_at) and bump the document's version counter"""
+    return {"$set": _prepare_update(collection_name, data), "$inc": {"version": 1}}
+
+def _id_filter(document_id: str, expected_version: Optional[int] = None) -> dict:
+    filter_dict = {"_id": ObjectId(document_id)}
+    if expected_version is not None:
+        # Documents written before versioning have no counter; they count as version 0
+        filter_dict["version"] = expected_version or None
+    return filter_dict
 
-    result = db[collection_name].insert_one(data_dict)
+def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    if db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    started = time.perf_counter()
+    result = db[collection_name].insert_one(_prepare_document(collection_name, data))
+    _record_write(collection_name, "insert", started)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+def _bulk_results(docs: list, error: Optional[BulkWriteError]) -> list:
+    # insert_many assigns _id client side, so every document not reported in
+    # writeErrors (indexes are relative to the batch) was inserted
+    failed = {}
+    if error is not None:
+        failed = {e["index"]: e.get("errmsg", "write error") for e in error.details.get("writeErrors", [])}
+    return [{"error": failed[i]} if i in failed else {"id": str(doc["_id"])} for i, doc in enumerate(docs)]
+
+def create_documents(collection_name: str, items: list, chunk_size: int = 1000):
+    """Insert many documents with timestamps using unordered insert_many in chunks
+
+    Returns one entry per item, in order: {"id": ...} or {"error": ...}.
+    """
     if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    results = []
+    for start in range(0, len(items), chunk_size):
+        docs = [_prepare_document(collection_name, item) for item in items[start:start + chunk_size]]
+        error = None
+        started = time.perf_counter()
+        try:
+            db[collection_name].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            error = e
+        _record_write(collection_name, "insert_many", started)
+        results.extend(_bulk_results(docs, error))
+    return results
+
+def _parse_sort(sort: str = None):
+    """Turn "field" / "-field" into a (field, direction) pair"""
+    if not sort:
+        return None, ASCENDING
+    if sort.startswith("-"):
+        return sort[1:], DESCENDING
+    return sort, ASCENDING
+
+def _get_path(doc: dict, field: str):
+    """Value at a dotted path (None if any part is missing), as Mongo sorts on it"""
+    value = doc
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def encode_cursor(doc: dict, sort: str = None) -> str:
+    """Build an opaque pagination cursor pointing just past `doc`"""
+    field, _ = _parse_sort(sort)
+    payload = {"id": doc["_id"]}
+    if field:
+        payload["k"] = _get_path(doc, field)
+    return base64.urlsafe_b64encode(json_util.dumps(payload).encode()).decode()
+
+# Values a cursor may carry. Cursors come back from clients, and json_util would
+# otherwise hand us live regexes, code or {"$op": ...} documents to query with.
+_CURSOR_SCALARS = (type(None), bool, int, float, str, datetime, ObjectId, Decimal128)
+
+def _plain_value(value) -> bool:
+    if isinstance(value, _CURSOR_SCALARS):
+        return True
+    if isinstance(value, list):
+        return all(_plain_value(v) for v in value)
+    if isinstance(value, dict):
+        return all(not k.startswith("$") and _plain_value(v) for k, v in value.items())
+    return False
+
+def decode_cursor(cursor: str) -> dict:
+    """Inverse of encode_cursor; raises ValueError on malformed or tampered input"""
+    try:
+        payload = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(payload, dict) or not isinstance(payload.get("id"), ObjectId):
+        raise ValueError("Invalid cursor")
+    if not _plain_value(payload.get("k")):
+        raise ValueError("Invalid cursor")
+    return payload
+
+def _keyset_filter(after: str, sort: str = None) -> dict:
+    field, direction = _parse_sort(sort)
+    payload = decode_cursor(after)
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if not field:
+        return {"_id": {op: payload["id"]}}
+    key = payload.get("k")
+    # Null/missing keys sort before every other value, and {"$gt": None} matches nothing
+    same_key = {field: {"$eq": key}, "_id": {op: payload["id"]}}
+    if key is None:
+        if direction == ASCENDING:
+            return {"$or": [same_key, {field: {"$ne": None}}]}
+        return same_key
+    clauses = [{field: {op: key}}, same_key]
+    if direction == DESCENDING:
+        clauses.append({field: None})
+    return {"$or": clauses}
+
+def _find(database, collection_name: str, filter_dict: dict = None, limit: int = None,
+          sort: str = None, after: str = None, projection: dict = None):
+    """Build a (PyMongo or Motor) cursor; both share the same sort/limit API"""
+    if database is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    filter_dict = filter_dict or {}
+    if after:
+        keyset = _keyset_filter(after, sort)
+        filter_dict = {"$and": [filter_dict, keyset]} if filter_dict else keyset
+
+    cursor = database[collection_name].find(filter_dict, projection)
+    # Pages are always in _id (or sort key) order, so the keyset cursor of one page follows on the next
+    if sort or after or limit:
+        field, direction = _parse_sort(sort)
+        keys = [(field, direction)] if field else []
+        cursor = cursor.sort(keys + [("_id", direction)])
     if limit:
         cursor = cursor.limit(limit)
-    
-    return list(cursor)
+    return cursor
+
+def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None,
+                  sort: str = None, after: str = None, projection: dict = None):
+    """Get documents from collection
+
+    `sort` is a field name (prefix with "-" for descending); results are always
+    tie-broken on _id so `after` (a cursor from encode_cursor) can resume a page
+    with an index seek instead of a skip. `projection` limits the returned fields.
+    """
+    return list(_find(db, collection_name, filter_dict, limit, sort, after, projection))
+
+def iter_documents(collection_name: str, filter_dict: dict = None, limit: int = None,
+                   sort: str = None, after: str = None, projection: dict = None, batch_size: int = 500):
+    """Lazily iterate documents, fetching `batch_size` at a time from the server"""
+    return _find(db, collection_name, filter_dict, limit, sort, after, projection).batch_size(batch_size)
+
+def get_document(collection_name: str, document_id: str, projection: dict = None):
+    """Get a single document by id, or None"""
+    if db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    return db[collection_name].find_one({"_id": ObjectId(document_id)}, projection)
+
+def get_documents_by_ids(collection_name: str, document_ids: list, projection: dict = None):
+    """Get the documents with the given ids (missing ids are skipped; order is not preserved)"""
+    if db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    return list(db[collection_name].find({"_id": {"$in": _object_ids(document_ids)}}, projection))
+
+def count_documents(collection_name: str, filter_dict: dict = None):
+    """Count documents matching a filter"""
+    if db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    return db[collection_name].count_documents(filter_dict or {})
+
+def document_exists(collection_name: str, filter_dict: dict):
+    """True if any document matches the filter"""
+    if db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    return db[collection_name].find_one(filter_dict, {"_id": 1}) is not None
+
+def update_document(collection_name: str, document_id: str, data: Union[BaseModel, dict],
+                    expected_version: Optional[int] = None):
+    """$set fields on a document by id and bump its version; returns the document as it was before the update
+
+    With expected_version the update only applies if the stored version still matches.
+    Returns None if no document matched.
+    """
+    if db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    started = time.perf_counter()
+    previous = db[collection_name].find_one_and_update(
+        _id_filter(document_id, expected_version), _update_spec(collection_name, data),
+        return_document=ReturnDocument.BEFORE,
+    )
+    _record_write(collection_name, "update", started)
+    return previous
+
+def update_documents(collection_name: str, updates: list):
+    """$set patches on many documents in one unordered bulk_write
+
+    `updates` is a list of (document_id, data) pairs. Returns the BulkWriteResult.
+    """
+    ops = [
+        UpdateOne({"_id": ObjectId(document_id)}, _update_spec(collection_name, data))
+        for document_id, data in updates
+    ]
+    return bulk_write(collection_name, ops)
+
+def update_many(collection_name: str, updates: list):
+    """$set patches on every document matching each filter, in one unordered bulk_write
+
+    `updates` is a list of (filter_dict, data) pairs. Returns the BulkWriteResult.
+    """
+    ops = [UpdateMany(filter_dict, _update_spec(collection_name, data)) for filter_dict, data in updates]
+    return bulk_write(collection_name, ops)
+
+def upsert_document(collection_name: str, filter_dict: dict, data: Union[BaseModel, dict]):
+    """Update the document matching filter_dict, or insert it with timestamps; returns its id"""
+    if db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    started = time.perf_counter()
+    doc = db[collection_name].find_one_and_update(
+        filter_dict,
+        {**_update_spec(collection_name, data), "$setOnInsert": {"created_at": datetime.now(timezone.utc)}},
+        projection={"_id": 1}, upsert=True, return_document=ReturnDocument.AFTER,
+    )
+    _record_write(collection_name, "upsert", started)
+    return str(doc["_id"])
+
+def delete_document(collection_name: str, document_id: str):
+    """Delete a document by id; returns the deleted document, or None"""
+    if db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    started = time.perf_counter()
+    previous = db[collection_name].find_one_and_delete({"_id": ObjectId(document_id)})
+    _record_write(collection_name, "delete", started)
+    return previous
+
+def delete_documents(collection_name: str, document_ids: list):
+    """Delete many documents by id in one unordered bulk_write; returns the BulkWriteResult"""
+    return bulk_write(collection_name, [DeleteOne({"_id": _id}) for _id in _object_ids(document_ids)])
+
+def bulk_write(collection_name: str, ops: list, ordered: bool = False):
+    """Run raw pymongo write ops (UpdateOne, DeleteOne, ...) through the instrumented path"""
+    if db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    started = time.perf_counter()
+    result = db[collection_name].bulk_write(ops, ordered=ordered)
+    _record_write(collection_name, "bulk_write", started)
+    return result
+
+# Async variants of the helpers above, backed by Motor. They take the same
+# arguments and can be awaited directly from async def endpoints.
+async def acreate_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    started = time.perf_counter()
+    result = await async_db[collection_name].insert_one(_prepare_document(collection_name, data))
+    _record_write(collection_name, "insert", started)
+    return str(result.inserted_id)
+
+async def acreate_documents(collection_name: str, items: list, chunk_size: int = 1000):
+    """Insert many documents in unordered chunks (see create_documents)"""
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    results = []
+    for start in range(0, len(items), chunk_size):
+        docs = [_prepare_document(collection_name, item) for item in items[start:start + chunk_size]]
+        error = None
+        started = time.perf_counter()
+        try:
+            await async_db[collection_name].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            error = e
+        _record_write(collection_name, "insert_many", started)
+        results.extend(_bulk_results(docs, error))
+    return results
+
+async def aget_documents(collection_name: str, filter_dict: dict = None, limit: int = None,
+                         sort: str = None, after: str = None, projection: dict = None):
+    """Get documents from collection (see get_documents)"""
+    return await _find(async_db, collection_name, filter_dict, limit, sort, after, projection).to_list(None)
+
+def aiter_documents(collection_name: str, filter_dict: dict = None, limit: int = None,
+                    sort: str = None, after: str = None, projection: dict = None, batch_size: int = 500):
+    """Async-iterable cursor fetching `batch_size` documents at a time"""
+    return _find(async_db, collection_name, filter_dict, limit, sort, after, projection).batch_size(batch_size)
+
+async def asearch_documents(collection_name: str, query: str, filter_dict: dict = None,
+                            limit: int = 20, projection: dict = None):
+    """Prefix search on the collection's SEARCH_FIELDS field, best matches first
+
+    Whole-value prefix matches come first (so an exact match leads), then
+    documents where every query word prefixes some word of the value. Both
+    steps are anchored range scans on the `_search` indexes, and both stop
+    early: the first reads at most `limit` entries in name order, the second
+    takes the first SEARCH_CANDIDATES documents on the longest query word's
+    search_terms range and filters and sorts only those. So for a very common
+    word prefix the second step can miss matches beyond those candidates; the
+    cost stays flat as the collection grows.
+    """
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    text = normalize_search_text(query)
+    if not text:
+        return []
+    collection = async_db[collection_name]
+    base = filter_dict or {}
+
+    results = await collection.find(
+        {**base, "_search.name": {"$regex": "^" + re.escape(text)}}, projection
+    ).sort("_search.name", ASCENDING).limit(limit).to_list(None)
+    if len(results) < limit:
+        seen = [doc["_id"] for doc in results]
+        words = text.split()
+        terms = [{"_search.terms": {"$regex": "^" + re.escape(word)}} for word in words]
+        longest = max(words, key=len)
+        pipeline = [
+            {"$match": {"_search.terms": {"$regex": "^" + re.escape(longest)}}},
+            {"$limit": SEARCH_CANDIDATES},
+            {"$match": {**base, "$and": terms, "_id": {"$nin": seen}}},
+            {"$sort": {"_search.name": ASCENDING}},
+            {"$limit": limit - len(results)},
+        ]
+        if projection:
+            pipeline.append({"$project": projection})
+        results += await collection.aggregate(pipeline).to_list(None)
+    return results
+
+async def aget_document(collection_name: str, document_id: str, projection: dict = None):
+    """Get a single document by id, or None"""
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    return await async_db[collection_name].find_one({"_id": ObjectId(document_id)}, projection)
+
+async def aget_documents_by_ids(collection_name: str, document_ids: list, projection: dict = None):
+    """Get the documents with the given ids (missing ids are skipped; order is not preserved)"""
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    return await async_db[collection_name].find({"_id": {"$in": _object_ids(document_ids)}}, projection).to_list(None)
+
+async def acount_documents(collection_name: str, filter_dict: dict = None):
+    """Count documents matching a filter"""
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    return await async_db[collection_name].count_documents(filter_dict or {})
+
+async def adocument_exists(collection_name: str, filter_dict: dict):
+    """True if any document matches the filter"""
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    return await async_db[collection_name].find_one(filter_dict, {"_id": 1}) is not None
+
+async def aupdate_document(collection_name: str, document_id: str, data: Union[BaseModel, dict],
+                           expected_version: Optional[int] = None):
+    """$set fields on a document by id and bump its version; returns the document as it was before the update
+
+    With expected_version the update only applies if the stored version still matches.
+    Returns None if no document matched.
+    """
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    started = time.perf_counter()
+    previous = await async_db[collection_name].find_one_and_update(
+        _id_filter(document_id, expected_version), _update_spec(collection_name, data),
+        return_document=ReturnDocument.BEFORE,
+    )
+    _record_write(collection_name, "update", started)
+    return previous
+
+async def aupdate_documents(collection_name: str, updates: list):
+    """$set patches on many documents in one unordered bulk_write
+
+    `updates` is a list of (document_id, data) pairs. Returns the BulkWriteResult.
+    """
+    ops = [
+        UpdateOne({"_id": ObjectId(document_id)}, _update_spec(collection_name, data))
+        for document_id, data in updates
+    ]
+    return await abulk_write(collection_name, ops)
+
+async def aupdate_many(collection_name: str, updates: list):
+    """$set patches on every document matching each filter, in one unordered bulk_write
+
+    `updates` is a list of (filter_dict, data) pairs. Returns the BulkWriteResult.
+    """
+    ops = [UpdateMany(filter_dict, _update_spec(collection_name, data)) for filter_dict, data in updates]
+    return await abulk_write(collection_name, ops)
+
+async def aupsert_document(collection_name: str, filter_dict: dict, data: Union[BaseModel, dict]):
+    """Update the document matching filter_dict, or insert it with timestamps; returns its id"""
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    started = time.perf_counter()
+    doc = await async_db[collection_name].find_one_and_update(
+        filter_dict,
+        {**_update_spec(collection_name, data), "$setOnInsert": {"created_at": datetime.now(timezone.utc)}},
+        projection={"_id": 1}, upsert=True, return_document=ReturnDocument.AFTER,
+    )
+    _record_write(collection_name, "upsert", started)
+    return str(doc["_id"])
+
+async def adelete_document(collection_name: str, document_id: str):
+    """Delete a document by id; returns the deleted document, or None"""
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    started = time.perf_counter()
+    previous = await async_db[collection_name].find_one_and_delete({"_id": ObjectId(document_id)})
+    _record_write(collection_name, "delete", started)
+    return previous
+
+async def adelete_documents(collection_name: str, document_ids: list):
+    """Delete many documents by id in one unordered bulk_write; returns the BulkWriteResult"""
+    return await abulk_write(collection_name, [DeleteOne({"_id": _id}) for _id in _object_ids(document_ids)])
+
+async def abulk_write(collection_name: str, ops: list, ordered: bool = False):
+    """Run raw pymongo write ops (UpdateOne, DeleteOne, ...) through the instrumented path"""
+    if async_db is None:
+        raise Exception(DATABASE_UNAVAILABLE)
+
+    started = time.perf_counter()
+    result = await async_db[collection_name].bulk_write(ops, ordered=ordered)
+    _record_write(collection_name, "bulk_write", started)
+    return result
+
+def backfill_search_fields(batch_size: int = 1000):
+    """Add `_search` to documents written before search was introduced (blocking)"""
+    if db is None:
+        return
+    for collection_name, field in SEARCH_FIELDS.items():
+        collection = db[collection_name]
+        cursor = collection.find({"_search": {"$exists": False}}, {field: 1}).batch_size(batch_size)
+        ops = []
+        for doc in cursor:
+            search = _search_fields(collection_name, doc)
+            if search is not None:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"_search": search}}))
+            if len(ops) >= batch_size:
+                bulk_write(collection_name, ops)
+                ops = []
+        if ops:
+            bulk_write(collection_name, ops)
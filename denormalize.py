@@ -0,0 +1,214 @@
+"""
+Denormalized Order Fields
+
+Orders carry a snapshot of their customer's display fields (CUSTOMER_FIELDS)
+so listing orders is a single-collection read. The snapshot is taken whenever
+an order is written (snapshot_customers) and refreshed when a customer's
+display fields change: propagate_customers() rewrites those customers' orders
+in one bulk_write, and main.py runs it as a background task after the customer
+update has been answered, so orders catch up shortly after a rename.
+
+Order items likewise carry the product's title and category (PRODUCT_FIELDS),
+resolved through product_cache with one batched lookup for whatever is not
+cached (snapshot_products). These are kept as they were when the order was
+written; later product edits don't rewrite past orders.
+
+Money totals are computed once at write time too (add_totals): each item gets
+its line_total and the order its total_amount and item_count (units), so
+analytics can sum them instead of multiplying per unwound item.
+
+backfill_orders() adds all of these to orders written before they existed
+(synchronously, meant for a background thread). Until then the read path
+falls back to looking the customer up.
+"""
+
+import os
+from typing import Optional
+
+from bson import ObjectId
+from cache import TTLCache
+from database import db, aget_documents_by_ids, aupdate_many, get_documents_by_ids, register_write_hook, update_many
+
+# Customer field -> field it is copied to on the order
+CUSTOMER_FIELDS = {"name": "customer_name", "email": "customer_email", "company": "customer_company"}
+CUSTOMER_PROJECTION = {field: 1 for field in CUSTOMER_FIELDS}
+
+# Product fields copied onto each order item
+PRODUCT_FIELDS = ("title", "category")
+PRODUCT_PROJECTION = {field: 1 for field in PRODUCT_FIELDS}
+
+# product_id -> {title, category}, or None for unknown products. Any product
+# write clears it, so a renamed or newly created product is picked up at once.
+product_cache = TTLCache(
+    maxsize=int(os.getenv("PRODUCT_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", 300)),
+)
+_MISSING = object()
+
+
+def _invalidate_products(collection_name: str, operation: str):
+    if collection_name == "product":
+        product_cache.clear()
+
+
+register_write_hook(_invalidate_products)
+
+
+def customer_snapshot(customer: Optional[dict]) -> dict:
+    """Order fields for a customer document (all None if the customer is unknown)"""
+    customer = customer or {}
+    return {order_field: customer.get(field) for field, order_field in CUSTOMER_FIELDS.items()}
+
+
+def _customer_ids(orders: list) -> list:
+    return list({o["customer_id"] for o in orders if ObjectId.is_valid(o.get("customer_id") or "")})
+
+
+async def snapshot_customers(orders: list) -> list:
+    """Copy the customer display fields onto order dicts with one batched lookup; mutates and returns them"""
+    ids = _customer_ids(orders)
+    customers = {}
+    if ids:
+        customers = {str(c["_id"]): c for c in await aget_documents_by_ids("customer", ids, CUSTOMER_PROJECTION)}
+    for order in orders:
+        order.update(customer_snapshot(customers.get(order.get("customer_id"))))
+    return orders
+
+
+def _product_ids(orders: list) -> list:
+    return list({
+        item.get("product_id") for o in orders for item in o.get("items") or []
+        if ObjectId.is_valid(item.get("product_id") or "")
+    })
+
+
+def _embed_products(orders: list, products: dict):
+    for order in orders:
+        for item in order.get("items") or []:
+            product = products.get(item.get("product_id")) or {}
+            for field in PRODUCT_FIELDS:
+                item[field] = product.get(field)
+
+
+async def product_map(product_ids: list) -> dict:
+    """product_id -> {title, category} (None if unknown), reading only uncached ids from Mongo"""
+    products, missing = {}, []
+    for product_id in product_ids:
+        cached = product_cache.get(product_id, _MISSING)
+        if cached is _MISSING:
+            missing.append(product_id)
+        else:
+            products[product_id] = cached
+    if missing:
+        generation = product_cache.generation
+        found = {str(p["_id"]): p for p in await aget_documents_by_ids("product", missing, PRODUCT_PROJECTION)}
+        for product_id in missing:
+            product = found.get(product_id)
+            products[product_id] = {f: product.get(f) for f in PRODUCT_FIELDS} if product else None
+            product_cache.set(product_id, products[product_id], generation)
+    return products
+
+
+async def snapshot_products(orders: list) -> list:
+    """Copy title and category onto every order item; mutates and returns the orders"""
+    _embed_products(orders, await product_map(_product_ids(orders)))
+    return orders
+
+
+def add_totals(order: dict) -> dict:
+    """Set line_total on each item and total_amount/item_count on the order; mutates and returns it"""
+    items = order.get("items") or []
+    for item in items:
+        item["line_total"] = (item.get("quantity") or 0) * (item.get("price") or 0)
+    order["total_amount"] = sum(item["line_total"] for item in items)
+    order["item_count"] = sum(item.get("quantity") or 0 for item in items)
+    return order
+
+
+async def snapshot(orders: list) -> list:
+    """Take the customer and product snapshots and totals for order dicts (full orders or patches)"""
+    await snapshot_customers([o for o in orders if "customer_id" in o])
+    await snapshot_products([o for o in orders if "items" in o])
+    for order in orders:
+        if "items" in order:
+            add_totals(order)
+    return orders
+
+
+async def propagate_customers(changes: list):
+    """Refresh the snapshot on the orders of each (customer_id, data) pair
+
+    Only the display fields present in `data` are written, and orders that already
+    hold those values are left alone (so their version doesn't move).
+    """
+    updates = []
+    for customer_id, data in changes:
+        fields = {CUSTOMER_FIELDS[f]: v for f, v in data.items() if f in CUSTOMER_FIELDS}
+        if fields:
+            stale = [{order_field: {"$ne": v}} for order_field, v in fields.items()]
+            updates.append(({"customer_id": customer_id, "$or": stale}, fields))
+    if updates:
+        await aupdate_many("order", updates)
+
+
+def display_fields_changed(previous: Optional[dict], data: dict) -> bool:
+    return previous is not None and any(previous.get(f) != data.get(f) for f in CUSTOMER_FIELDS if f in data)
+
+
+def backfill_orders(batch_size: int = 1000) -> int:
+    """Snapshot customer and product fields into orders that predate them (blocking)
+
+    Each order is only written if its version is still the one read, so an edit
+    made meanwhile is never overwritten (that order is picked up on the next
+    run). Returns the number of orders whose items were filled in, since those
+    change the category rollup.
+    """
+    if db is None:
+        return 0
+    stale = {"$or": [
+        {"customer_name": {"$exists": False}},
+        {"total_amount": {"$exists": False}},
+        {"items": {"$elemMatch": {"category": {"$exists": False}}}},
+    ]}
+    projection = {"customer_id": 1, "customer_name": 1, "total_amount": 1, "items": 1, "version": 1}
+    cursor = db["order"].find(stale, projection).batch_size(batch_size)
+    items_filled = 0
+    batch = []
+    for order in cursor:
+        batch.append(order)
+        if len(batch) >= batch_size:
+            items_filled += _backfill_batch(batch)
+            batch = []
+    if batch:
+        items_filled += _backfill_batch(batch)
+    return items_filled
+
+
+def _backfill_batch(orders: list) -> int:
+    customer_ids = _customer_ids([o for o in orders if "customer_name" not in o])
+    customers = {}
+    if customer_ids:
+        customers = {str(c["_id"]): c for c in get_documents_by_ids("customer", customer_ids, CUSTOMER_PROJECTION)}
+    product_ids = _product_ids(orders)
+    products = {}
+    if product_ids:
+        products = {str(p["_id"]): p for p in get_documents_by_ids("product", product_ids, PRODUCT_PROJECTION)}
+
+    updates = []
+    items_filled = 0
+    for order in orders:
+        fields = {}
+        if "customer_name" not in order:
+            fields.update(customer_snapshot(customers.get(order.get("customer_id"))))
+        items = order.get("items") or []
+        if any("category" not in item for item in items):
+            _embed_products([order], products)
+            fields["items"] = items
+            items_filled += 1
+        if "total_amount" not in order or "items" in fields:
+            add_totals(order)
+            fields.update(items=items, total_amount=order["total_amount"], item_count=order["item_count"])
+        # update_many also bumps the version, so ETags handed out earlier go stale
+        updates.append(({"_id": order["_id"], "version": order.get("version")}, fields))
+    update_many("order", updates)
+    return items_filled
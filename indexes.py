@@ -0,0 +1,74 @@
+"""
+Database Indexes
+
+Declare the indexes each collection needs here, next to schemas.py. Every
+entry is a pymongo IndexModel, so compound keys and options such as
+unique=True, partialFilterExpression={...} or expireAfterSeconds=N (TTL) are
+written exactly as they would be passed to create_index. Give each index an
+explicit name: the name is what ensure_indexes() and index_report() use to
+decide whether it already exists.
+"""
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from database import db, async_db
+
+INDEXES = {
+    "user": [
+        # login looks users up by email
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+    "customer": [
+        # ?q= prefix search (see database.SEARCH_FIELDS)
+        IndexModel([("_search.name", ASCENDING)], name="search_name"),
+        IndexModel([("_search.terms", ASCENDING)], name="search_terms"),
+    ],
+    "product": [
+        # category filter, then keyset pagination on _id
+        IndexModel([("category", ASCENDING), ("_id", ASCENDING)], name="category_id"),
+        IndexModel([("_search.name", ASCENDING)], name="search_name"),
+        IndexModel([("_search.terms", ASCENDING)], name="search_terms"),
+    ],
+    "order": [
+        # status filter, then keyset pagination on _id
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)], name="status_id"),
+        # analytics date range
+        IndexModel([("order_date", DESCENDING)], name="order_date"),
+        IndexModel([("customer_id", ASCENDING)], name="customer_id"),
+    ],
+    "sales_daily_category": [
+        IndexModel([("day", ASCENDING), ("category", ASCENDING)], name="day_category", unique=True),
+    ],
+}
+
+# Outcome of the last ensure_indexes() run, per collection: "ok" or the error message
+build_status = {}
+
+
+def ensure_indexes():
+    """Create any missing registry indexes (blocking; run it off the request path)"""
+    if db is None:
+        return
+    for collection_name, models in INDEXES.items():
+        try:
+            db[collection_name].create_indexes(models)
+            build_status[collection_name] = "ok"
+        except Exception as e:
+            build_status[collection_name] = str(e)[:200]
+
+
+async def index_report() -> dict:
+    """Per collection: which registry indexes are present, which are missing, and any others found"""
+    report = {}
+    for collection_name, models in INDEXES.items():
+        expected = [m.document["name"] for m in models]
+        existing = []
+        if async_db is not None:
+            existing = [ix["name"] async for ix in async_db[collection_name].list_indexes()]
+        report[collection_name] = {
+            "present": [name for name in expected if name in existing],
+            "missing": [name for name in expected if name not in existing],
+            "unmanaged": [name for name in existing if name != "_id_" and name not in expected],
+            "build_status": build_status.get(collection_name, "pending"),
+        }
+    return report
@@ -0,0 +1,161 @@
+"""
+Buffered Event Ingest
+
+Write-behind batching for high-volume, fire-and-forget documents such as
+activity and page-view tracking. submit() puts the document on a bounded
+in-memory queue and returns immediately; a background thread per collection
+flushes the queue with insert_many (via database.create_documents) once
+`batch_size` documents are waiting or `flush_interval` seconds have passed.
+
+When the queue is full the overflow policy decides: "drop" discards the new
+event, "block" waits up to `block_timeout` seconds for room, then drops.
+Writers are flushed and stopped at interpreter exit (and by main.py on
+shutdown). A batch that fails to write is counted and discarded, not retried.
+
+Settings come from INGEST_BATCH_SIZE, INGEST_FLUSH_INTERVAL,
+INGEST_MAX_QUEUE, INGEST_OVERFLOW and INGEST_BLOCK_TIMEOUT.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from bson import ObjectId
+
+from database import create_documents, ensure_collection
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    def __init__(self, collection_name: str, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_queue: int = 10000, overflow: str = "drop", block_timeout: float = 1.0):
+        if overflow not in ("drop", "block"):
+            raise ValueError("overflow must be 'drop' or 'block'")
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.total_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"ingest-{collection_name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, doc: dict) -> str:
+        """Queue a document for insertion; returns its id, or None if it was dropped"""
+        if self._closed.is_set():
+            raise RuntimeError(f"BatchWriter for {self.collection_name} is closed")
+        doc = {**doc, "_id": doc.get("_id") or ObjectId()}
+        try:
+            if self.overflow == "block":
+                self._queue.put(doc, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(doc)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return None
+        with self._lock:
+            self.submitted += 1
+        return str(doc["_id"])
+
+    def close(self, timeout: float = 10.0):
+        """Stop accepting events, flush what is queued and stop the thread"""
+        self._closed.set()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "flushes": self.flushes,
+                "avg_flush_ms": round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+                "max_flush_ms": round(self.max_flush_ms, 3),
+            }
+
+    def _next_batch(self) -> list:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._closed.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _run(self):
+        while not (self._closed.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: list):
+        started = time.perf_counter()
+        try:
+            ensure_collection(self.collection_name)
+            results = create_documents(self.collection_name, batch, chunk_size=len(batch))
+            ok = sum(1 for r in results if "id" in r)
+            failed = len(batch) - ok
+        except Exception:
+            logger.exception("Failed to flush %d events to %s", len(batch), self.collection_name)
+            ok, failed = 0, len(batch)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.written += ok
+            self.failed += failed
+            self.flushes += 1
+            self.total_flush_ms += elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(collection_name: str) -> BatchWriter:
+    """Shared writer for a collection, created on first use from INGEST_* settings"""
+    with _writers_lock:
+        writer = _writers.get(collection_name)
+        if writer is None:
+            writer = _writers[collection_name] = BatchWriter(
+                collection_name,
+                batch_size=int(os.getenv("INGEST_BATCH_SIZE", 500)),
+                flush_interval=float(os.getenv("INGEST_FLUSH_INTERVAL", 1.0)),
+                max_queue=int(os.getenv("INGEST_MAX_QUEUE", 10000)),
+                overflow=os.getenv("INGEST_OVERFLOW", "drop"),
+                block_timeout=float(os.getenv("INGEST_BLOCK_TIMEOUT", 1.0)),
+            )
+        return writer
+
+
+def stats() -> dict:
+    with _writers_lock:
+        return {name: writer.stats() for name, writer in _writers.items()}
+
+
+@atexit.register
+def close_all():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
@@ -1,16 +1,39 @@
 import os
+import re
+import csv
+import io
+import codecs
+import hashlib
+import logging
+import orjson
+import threading
 from datetime import datetime
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Query
+from typing import Annotated, List, Optional
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from bson import ObjectId
 
 # Local imports
 from schemas import User, Customer, Product, Order, Sale
-from database import db, create_document, get_documents
+import rollups
+import columnar
+import denormalize
+import indexes
+import ingest
+from cache import SingleFlight, TTLCache
+from serializers import DocumentResponse, dumps, serialize_doc
+from database import (
+    async_db, encode_cursor, client_options, pool_metrics, write_stats, register_write_hook,
+    acreate_document, acreate_documents, aget_document, aget_documents, aget_documents_by_ids, aiter_documents,
+    aupdate_document, aupdate_documents, adelete_document, adelete_documents,
+    asearch_documents, backfill_search_fields,
+)
+
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Business Dashboard API")
+app = FastAPI(title="Business Dashboard API", default_response_class=DocumentResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,8 +41,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Not CORS-safelisted; the dashboard needs them to paginate and to send If-Match
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+@app.on_event("startup")
+def start_index_build():
+    # Index builds can take a while on large collections; don't hold up startup
+    threading.Thread(target=indexes.ensure_indexes, daemon=True).start()
+
+@app.on_event("startup")
+def start_search_backfill():
+    threading.Thread(target=backfill_search_fields, daemon=True).start()
+
+@app.on_event("startup")
+def start_order_backfill():
+    # Backfill orders, then the analytics rollup, off the request path; reads fall
+    # back to the raw pipeline until the rollup is built. One thread, so the rollup
+    # is always built from backfilled orders and two builds never overlap.
+    def run():
+        try:
+            # Filling in item categories changes the per-category rollup and the columnar engine
+            if denormalize.backfill_orders():
+                rollups.rebuild()
+            else:
+                rollups.ensure_built()
+        except Exception:
+            logger.exception("Order backfill / rollup build failed")
+        columnar.load()
+    threading.Thread(target=run, daemon=True).start()
+
+@app.on_event("shutdown")
+def flush_ingest_buffers():
+    ingest.close_all()
+
 # Helpers
 class ObjectIdStr(str):
     @classmethod
@@ -33,24 +88,188 @@ class ObjectIdStr(str):
         except Exception:
             raise ValueError("Invalid ObjectId")
 
-def serialize_doc(doc: dict):
-    if not doc:
-        return doc
-    d = {**doc}
-    if "_id" in d:
-        d["id"] = str(d.pop("_id"))
-    # Convert datetimes to isoformat for JSON
-    for k, v in list(d.items()):
-        if isinstance(v, datetime):
-            d[k] = v.isoformat()
-    return d
+async def attach_customer_names(orders: List[dict]):
+    """Render customer_name on serialized orders
+
+    Orders carry it denormalized (see denormalize.py); only orders written before
+    that need the batched customer lookup.
+    """
+    missing = [d for d in orders if "customer_name" not in d]
+    ids = {d["customer_id"] for d in missing if d.get("customer_id") and ObjectId.is_valid(d["customer_id"])}
+    names = {}
+    if ids and async_db is not None:
+        customers = await aget_documents_by_ids("customer", list(ids), {"name": 1})
+        names = {str(c["_id"]): c.get("name") for c in customers}
+    for d in missing:
+        d["customer_name"] = names.get(d.get("customer_id"))
+    for d in orders:
+        if d["customer_name"] is None:
+            d["customer_name"] = "—"
+    return orders
+
+# Keyset pagination params shared by the list endpoints
+SORT_PATTERN = r"^-?[A-Za-z_][A-Za-z0-9_.]*$"
+MAX_PAGE_SIZE = 1000
+# JSON list responses are paged even without ?limit= (NDJSON streams stay unbounded)
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 100))
+
+def next_cursor_headers(docs: List[dict], limit: Optional[int], sort: Optional[str]) -> dict:
+    """Expose the cursor for the following page via the X-Next-Cursor header"""
+    if limit and len(docs) == limit:
+        return {"X-Next-Cursor": encode_cursor(docs[-1], sort)}
+    return {}
+
+# Conditional requests: ETag + If-None-Match (304) on reads, If-Match on PUT.
+# Detail ETags are the document's version counter; list ETags hash the body.
+def version_etag(version: Optional[int], projection: Optional[dict] = None) -> str:
+    """ETag for a document version; a ?fields= projection gets its own tag"""
+    if projection is None:
+        return f'"v{version or 0}"'
+    fields = ",".join(sorted(projection)).encode()
+    return f'"v{version or 0}-{hashlib.blake2b(fields, digest_size=4).hexdigest()}"'
+
+def with_version(projection: Optional[dict]) -> Optional[dict]:
+    if projection is not None:
+        projection["version"] = 1
+    return projection
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Weak comparison of an ETag against an If-None-Match header"""
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+def conditional_response(request: Request, content, headers: Optional[dict] = None, etag: Optional[str] = None):
+    """Render content with an ETag, or an empty 304 if the client already has it"""
+    body = dumps(content)
+    if etag is None:
+        etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {**(headers or {}), "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+def if_match_version(request: Request) -> Optional[int]:
+    """Version an If-Match header requires (None when absent or "*"); 412 if it can't match"""
+    header = (request.headers.get("if-match") or "").strip()
+    if not header or header == "*":
+        return None
+    # Any projection of a version names the same version
+    match = re.match(r'^"v(\d+)(?:-[0-9a-f]+)?"$', header.split(",")[0].strip())
+    if match is None:
+        raise HTTPException(status_code=412, detail="Precondition Failed")
+    return int(match.group(1))
+
+def updated_response(request: Request, previous: Optional[dict]):
+    """PUT result carrying the new ETag; 412 when an If-Match precondition didn't hold"""
+    if previous is None:
+        if request.headers.get("if-match"):
+            raise HTTPException(status_code=412, detail="Precondition Failed")
+        return DocumentResponse({"updated": True})
+    return DocumentResponse({"updated": True}, headers={"ETag": version_etag((previous.get("version") or 0) + 1)})
+
+# Default number of results for ?q= searches (relevance ordered, not paginated)
+SEARCH_LIMIT = 20
+
+# ?fields=a,b,c projection shared by the list and detail endpoints
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+FIELDS_PATTERN = r"^[A-Za-z_][A-Za-z0-9_.]*(,[A-Za-z_][A-Za-z0-9_.]*)*$"
+
+def parse_fields(fields: Optional[str], sort: Optional[str] = None) -> Optional[dict]:
+    """Turn a comma separated field list into a Mongo projection (None = whole document)"""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    for name in names:
+        if not FIELD_NAME.match(name):
+            raise ValueError(f"Invalid field name: {name}")
+    for name in names:
+        parent = next((other for other in names if name.startswith(other + ".")), None)
+        if parent is not None:
+            # Mongo rejects a projection with both a path and its parent
+            raise ValueError(f"Field {name} overlaps {parent}")
+    projection = {name: 1 for name in names}
+    # Keyset cursors are built from the sort key, so it has to come back too
+    if sort:
+        key = sort.lstrip("-")
+        if not any(key == name or key.startswith(name + ".") for name in names):
+            for name in [n for n in names if n.startswith(key + ".")]:
+                del projection[name]
+            projection[key] = 1
+    return projection
+
+def order_projection(fields: Optional[str], sort: Optional[str] = None):
+    """Projection for orders plus whether customer_name is wanted"""
+    projection = parse_fields(fields, sort)
+    if projection is None:
+        return None, True
+    join = "customer_name" in projection
+    if join:
+        # Needed for orders that predate the denormalized name
+        projection["customer_id"] = 1
+    return projection, join
+
+# Opt-in NDJSON streaming for the list endpoints (Accept: application/x-ndjson)
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def ndjson_response(cursor, batch_size: int, enrich=None):
+    """Stream documents as newline-delimited JSON, holding at most one batch in memory"""
+    async def flush(batch):
+        if enrich:
+            await enrich(batch)
+        return b"".join(dumps(d) + b"\n" for d in batch)
+
+    async def generate():
+        batch = []
+        async for doc in cursor:
+            batch.append(serialize_doc(doc))
+            if len(batch) >= batch_size:
+                yield await flush(batch)
+                batch = []
+        if batch:
+            yield await flush(batch)
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+# Streaming CSV exports, written one cursor batch at a time
+EXPORT_BATCH_SIZE = 1000
+
+def csv_response(rows, filename: str):
+    """Stream an async iterable of row batches (header first) as CSV"""
+    async def generate():
+        async for batch in rows:
+            buf = io.StringIO()
+            csv.writer(buf).writerows(batch)
+            yield buf.getvalue()
+    return StreamingResponse(
+        generate(), media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+def csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+async def batches(cursor, size: int):
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Business Dashboard API running"}
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -60,13 +279,16 @@ def test_database():
         "collections": []
     }
     try:
-        if db is not None:
+        if async_db is not None:
             response["database"] = "✅ Available"
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-            response["database_name"] = getattr(db, "name", None) or "Unknown"
+            response["database_name"] = getattr(async_db, "name", None) or "Unknown"
             response["connection_status"] = "Connected"
+            response["client_options"] = {"async": client_options(), "sync": client_options(sync=True)}
+            response["pool"] = pool_metrics.snapshot()
+            response["writes"] = write_stats
             try:
-                response["collections"] = db.list_collection_names()[:10]
+                response["collections"] = (await async_db.list_collection_names())[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
                 response["database"] = f"⚠️ Connected but Error: {str(e)[:80]}"
@@ -85,23 +307,23 @@ class AuthResponse(BaseModel):
     user: dict
 
 @app.post("/auth/signup", response_model=AuthResponse)
-def signup(payload: AuthRequest):
+async def signup(payload: AuthRequest):
     # Very simple demo-only signup: store user document (password in plain text for demo)
     user = User(name=payload.name or payload.email.split("@")[0], email=payload.email, password=payload.password)
     try:
-        user_id = create_document("user", user)
+        user_id = await acreate_document("user", user)
         return {"token": user_id, "user": {"id": user_id, "name": user.name, "email": user.email}}
     except Exception:
         # Fallback without DB
         return {"token": "demo-token", "user": {"id": "demo-user", "name": user.name, "email": user.email}}
 
 @app.post("/auth/login", response_model=AuthResponse)
-def login(payload: AuthRequest):
+async def login(payload: AuthRequest):
     # Demo login always succeeds and returns dummy token
     try:
         # Try to find user
-        if db is not None:
-            doc = db["user"].find_one({"email": payload.email})
+        if async_db is not None:
+            doc = await async_db["user"].find_one({"email": payload.email})
             if doc:
                 uid = str(doc["_id"])
                 name = doc.get("name", payload.email)
@@ -110,136 +332,627 @@ def login(payload: AuthRequest):
         pass
     return {"token": "demo-token", "user": {"id": "demo-user", "name": payload.email.split("@")[0], "email": payload.email}}
 
+async def apply_order_changes(removed: List[dict], added: List[dict]):
+    """Move order contributions out of / into the sales rollups and the columnar engine
+
+    Called after the order write has committed, so it never raises: a failed
+    update is logged and that store is rebuilt, with reads falling back to the
+    raw pipeline until then.
+    """
+    try:
+        await rollups.apply_orders(removed, -1)
+        await rollups.apply_orders(added)
+    except Exception:
+        logger.exception("Rollup update failed; rebuilding the rollups")
+        await rollups.invalidate()
+    try:
+        columnar.apply_orders(removed, added)
+    except Exception:
+        logger.exception("Columnar update failed; reloading the engine")
+        columnar.reload()
+
+async def get_or_404(collection_name: str, document_id: str, projection: Optional[dict] = None):
+    if async_db is None or not ObjectId.is_valid(document_id):
+        raise HTTPException(status_code=404, detail="Not found")
+    doc = await aget_document(collection_name, document_id, projection)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return doc
+
 # CRUD Endpoints: Customers
 @app.get("/customers")
-def list_customers(q: Optional[str] = None):
+async def list_customers(
+    request: Request,
+    q: Optional[str] = None,
+    after: Annotated[Optional[str], Query(description="Cursor from X-Next-Cursor")] = None,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})")] = None,
+    sort: Annotated[Optional[str], Query(pattern=SORT_PATTERN, description="Field, prefix - for descending")] = None,
+    batch_size: Annotated[int, Query(ge=1, le=10000, description="Cursor batch size when streaming")] = 500,
+    fields: Annotated[Optional[str], Query(pattern=FIELDS_PATTERN, description="Comma separated fields to return")] = None,
+):
     try:
-        filt = {"name": {"$regex": q, "$options": "i"}} if q else {}
-        docs = get_documents("customer", filt)
-        return [serialize_doc(d) for d in docs]
+        filt = {}
+        projection = parse_fields(fields, sort)
+        if q:
+            docs = await asearch_documents("customer", q, filt, limit=limit or SEARCH_LIMIT, projection=projection)
+            return conditional_response(request, [serialize_doc(d) for d in docs])
+        if wants_ndjson(request):
+            docs = aiter_documents("customer", filt, limit=limit, sort=sort, after=after,
+                                   projection=projection, batch_size=batch_size)
+            return ndjson_response(docs, batch_size)
+        limit = limit or DEFAULT_PAGE_SIZE
+        docs = await aget_documents("customer", filt, limit=limit, sort=sort, after=after, projection=projection)
+        headers = next_cursor_headers(docs, limit, sort)
+        return conditional_response(request, [serialize_doc(d) for d in docs], headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception:
         # Dummy data fallback
         return [{"id": "c1", "name": "Alice", "email": "alice@example.com", "status": "active"}]
 
+CUSTOMER_EXPORT_COLUMNS = ["id", "name", "email", "phone", "company", "address", "status", "created_at"]
+
+@app.get("/customers/export.csv")
+async def export_customers(status: Optional[str] = None):
+    if async_db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    filt = {"status": status} if status else {}
+    cursor = aiter_documents("customer", filt, sort="_id", batch_size=EXPORT_BATCH_SIZE)
+
+    async def rows():
+        yield [CUSTOMER_EXPORT_COLUMNS]
+        async for docs in batches(cursor, EXPORT_BATCH_SIZE):
+            yield [[csv_value(serialize_doc(d).get(c)) for c in CUSTOMER_EXPORT_COLUMNS] for d in docs]
+    return csv_response(rows(), "customers.csv")
+
+@app.get("/customers/{customer_id}")
+async def get_customer(
+    request: Request,
+    customer_id: str,
+    fields: Annotated[Optional[str], Query(pattern=FIELDS_PATTERN, description="Comma separated fields to return")] = None,
+):
+    try:
+        projection = with_version(parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    doc = serialize_doc(await get_or_404("customer", customer_id, projection))
+    return conditional_response(request, doc, etag=version_etag(doc.get("version"), projection))
+
 @app.post("/customers")
-def create_customer(customer: Customer):
+async def create_customer(customer: Customer):
     try:
-        cid = create_document("customer", customer)
+        cid = await acreate_document("customer", customer)
         return {"id": cid}
     except Exception:
         return {"id": "demo"}
 
 @app.put("/customers/{customer_id}")
-def update_customer(customer_id: str, payload: Customer):
+async def update_customer(request: Request, background_tasks: BackgroundTasks, customer_id: str, payload: Customer):
     try:
-        if db is None:
+        if async_db is None:
             return {"updated": False}
-        db["customer"].update_one({"_id": ObjectId(customer_id)}, {"$set": payload.model_dump()})
-        return {"updated": True}
+        data = payload.model_dump()
+        previous = await aupdate_document("customer", customer_id, data, expected_version=if_match_version(request))
+        if denormalize.display_fields_changed(previous, data):
+            background_tasks.add_task(denormalize.propagate_customers, [(customer_id, data)])
+        return updated_response(request, previous)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/customers/{customer_id}")
-def delete_customer(customer_id: str):
+async def delete_customer(customer_id: str):
     try:
-        if db is None:
+        if async_db is None:
             return {"deleted": False}
-        db["customer"].delete_one({"_id": ObjectId(customer_id)})
+        await adelete_document("customer", customer_id)
         return {"deleted": True}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # CRUD Endpoints: Products
 @app.get("/products")
-def list_products(category: Optional[str] = None, q: Optional[str] = None):
+async def list_products(
+    request: Request,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    after: Annotated[Optional[str], Query(description="Cursor from X-Next-Cursor")] = None,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})")] = None,
+    sort: Annotated[Optional[str], Query(pattern=SORT_PATTERN, description="Field, prefix - for descending")] = None,
+    batch_size: Annotated[int, Query(ge=1, le=10000, description="Cursor batch size when streaming")] = 500,
+    fields: Annotated[Optional[str], Query(pattern=FIELDS_PATTERN, description="Comma separated fields to return")] = None,
+):
     try:
         filt = {}
         if category:
             filt["category"] = category
+        projection = parse_fields(fields, sort)
         if q:
-            filt["title"] = {"$regex": q, "$options": "i"}
-        docs = get_documents("product", filt)
-        return [serialize_doc(d) for d in docs]
+            docs = await asearch_documents("product", q, filt, limit=limit or SEARCH_LIMIT, projection=projection)
+            return conditional_response(request, [serialize_doc(d) for d in docs])
+        if wants_ndjson(request):
+            docs = aiter_documents("product", filt, limit=limit, sort=sort, after=after,
+                                   projection=projection, batch_size=batch_size)
+            return ndjson_response(docs, batch_size)
+        limit = limit or DEFAULT_PAGE_SIZE
+        docs = await aget_documents("product", filt, limit=limit, sort=sort, after=after, projection=projection)
+        headers = next_cursor_headers(docs, limit, sort)
+        return conditional_response(request, [serialize_doc(d) for d in docs], headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception:
         return [
             {"id": "p1", "title": "Premium Plan", "price": 99, "category": "subscriptions", "in_stock": True}
         ]
 
+@app.get("/products/{product_id}")
+async def get_product(
+    request: Request,
+    product_id: str,
+    fields: Annotated[Optional[str], Query(pattern=FIELDS_PATTERN, description="Comma separated fields to return")] = None,
+):
+    try:
+        projection = with_version(parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    doc = serialize_doc(await get_or_404("product", product_id, projection))
+    return conditional_response(request, doc, etag=version_etag(doc.get("version"), projection))
+
 @app.post("/products")
-def create_product(product: Product):
+async def create_product(product: Product):
     try:
-        pid = create_document("product", product)
+        pid = await acreate_document("product", product)
         return {"id": pid}
     except Exception:
         return {"id": "demo"}
 
 @app.put("/products/{product_id}")
-def update_product(product_id: str, payload: Product):
+async def update_product(request: Request, product_id: str, payload: Product):
     try:
-        if db is None:
+        if async_db is None:
             return {"updated": False}
-        db["product"].update_one({"_id": ObjectId(product_id)}, {"$set": payload.model_dump()})
-        return {"updated": True}
+        previous = await aupdate_document("product", product_id, payload, expected_version=if_match_version(request))
+        return updated_response(request, previous)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: str):
+async def delete_product(product_id: str):
     try:
-        if db is None:
+        if async_db is None:
             return {"deleted": False}
-        db["product"].delete_one({"_id": ObjectId(product_id)})
+        await adelete_document("product", product_id)
         return {"deleted": True}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # CRUD Endpoints: Orders
 @app.get("/orders")
-def list_orders(status: Optional[str] = None):
+async def list_orders(
+    request: Request,
+    status: Optional[str] = None,
+    after: Annotated[Optional[str], Query(description="Cursor from X-Next-Cursor")] = None,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE, description=f"Page size (default {DEFAULT_PAGE_SIZE})")] = None,
+    sort: Annotated[Optional[str], Query(pattern=SORT_PATTERN, description="Field, prefix - for descending")] = None,
+    batch_size: Annotated[int, Query(ge=1, le=10000, description="Cursor batch size when streaming")] = 500,
+    fields: Annotated[Optional[str], Query(pattern=FIELDS_PATTERN, description="Comma separated fields to return")] = None,
+):
     try:
         filt = {"status": status} if status else {}
-        docs = get_documents("order", filt)
-        # Join basic customer name
-        results = []
-        for d in docs:
-            d = serialize_doc(d)
-            if db is not None:
-                cust = db["customer"].find_one({"_id": ObjectId(d["customer_id"])}) if d.get("customer_id") else None
-                d["customer_name"] = cust.get("name") if cust else "—"
-            results.append(d)
-        return results
+        projection, join = order_projection(fields, sort)
+        if wants_ndjson(request):
+            docs = aiter_documents("order", filt, limit=limit, sort=sort, after=after,
+                                   projection=projection, batch_size=batch_size)
+            return ndjson_response(docs, batch_size, attach_customer_names if join else None)
+        limit = limit or DEFAULT_PAGE_SIZE
+        docs = await aget_documents("order", filt, limit=limit, sort=sort, after=after, projection=projection)
+        headers = next_cursor_headers(docs, limit, sort)
+        results = [serialize_doc(d) for d in docs]
+        if join:
+            await attach_customer_names(results)
+        return conditional_response(request, results, headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception:
         return [{"id": "o1", "status": "paid", "customer_name": "Alice", "items": [], "order_date": datetime.utcnow().isoformat()}]
 
+ORDER_EXPORT_COLUMNS = ["order_id", "order_date", "status", "customer_id", "customer_name"]
+ITEM_EXPORT_COLUMNS = ["product_id", "quantity", "price", "line_total"]
+
+def order_rows(order: dict) -> list:
+    """One CSV row per order item (one row with blank item columns if there are none)"""
+    head = [csv_value(order.get(c)) for c in ("id", "order_date", "status", "customer_id", "customer_name")]
+    items = order.get("items") or [{}]
+    rows = []
+    for item in items:
+        quantity, price, line_total = item.get("quantity"), item.get("price"), item.get("line_total")
+        if line_total is None and quantity is not None and price is not None:
+            line_total = quantity * price
+        line_total = round(line_total, 2) if line_total is not None else None
+        rows.append(head + [csv_value(v) for v in (item.get("product_id"), quantity, price, line_total)])
+    return rows
+
+@app.get("/orders/export.csv")
+async def export_orders(
+    status: Optional[str] = None,
+    start_date: Optional[str] = Query(None, description="ISO date"),
+    end_date: Optional[str] = Query(None, description="ISO date"),
+):
+    filt = {"status": status} if status else {}
+    try:
+        rng = {}
+        if start_date:
+            rng["$gte"] = datetime.fromisoformat(start_date)
+        if end_date:
+            rng["$lte"] = datetime.fromisoformat(end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if async_db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    if rng:
+        filt["order_date"] = rng
+    cursor = aiter_documents("order", filt, sort="_id", batch_size=EXPORT_BATCH_SIZE)
+
+    async def rows():
+        yield [ORDER_EXPORT_COLUMNS + ITEM_EXPORT_COLUMNS]
+        async for docs in batches(cursor, EXPORT_BATCH_SIZE):
+            orders = [serialize_doc(d) for d in docs]
+            await attach_customer_names(orders)
+            yield [row for order in orders for row in order_rows(order)]
+    return csv_response(rows(), "orders.csv")
+
+@app.get("/orders/{order_id}")
+async def get_order(
+    request: Request,
+    order_id: str,
+    fields: Annotated[Optional[str], Query(pattern=FIELDS_PATTERN, description="Comma separated fields to return")] = None,
+):
+    try:
+        projection, join = order_projection(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = serialize_doc(await get_or_404("order", order_id, with_version(projection)))
+    if join:
+        await attach_customer_names([result])
+    return conditional_response(request, result, etag=version_etag(result.get("version"), projection))
+
 @app.post("/orders")
-def create_order(order: Order):
+async def create_order(order: Order):
     try:
-        oid = create_document("order", order)
+        data = order.model_dump()
+        await denormalize.snapshot([data])
+        oid = await acreate_document("order", data)
+        await apply_order_changes([], [{**data, "_id": oid}])
         return {"id": oid}
     except Exception:
         return {"id": "demo"}
 
 @app.put("/orders/{order_id}")
-def update_order(order_id: str, payload: Order):
+async def update_order(request: Request, order_id: str, payload: Order):
     try:
-        if db is None:
+        if async_db is None:
             return {"updated": False}
-        db["order"].update_one({"_id": ObjectId(order_id)}, {"$set": payload.model_dump()})
-        return {"updated": True}
+        data = payload.model_dump()
+        await denormalize.snapshot([data])
+        previous = await aupdate_document("order", order_id, data, expected_version=if_match_version(request))
+        if previous is not None:
+            await apply_order_changes([previous], [{**previous, **data}])
+        return updated_response(request, previous)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/orders/{order_id}")
-def delete_order(order_id: str):
+async def delete_order(order_id: str):
     try:
-        if db is None:
+        if async_db is None:
             return {"deleted": False}
-        db["order"].delete_one({"_id": ObjectId(order_id)})
+        previous = await adelete_document("order", order_id)
+        await apply_order_changes([previous], [])
         return {"deleted": True}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# Bulk inserts: POST /{collection}/bulk with a JSON array or an NDJSON body
+BULK_COLLECTIONS = {
+    "customers": ("customer", Customer),
+    "products": ("product", Product),
+    "orders": ("order", Order),
+}
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 1000))
+
+async def read_bulk_items(request: Request) -> list:
+    """Parse the body into raw items; an unparseable NDJSON line becomes an Exception entry"""
+    body = await request.body()
+    if NDJSON_MEDIA_TYPE in request.headers.get("content-type", ""):
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(orjson.loads(line))
+            except orjson.JSONDecodeError as e:
+                items.append(e)
+        return items
+    try:
+        items = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    return items
+
+@app.post("/{collection}/bulk")
+async def bulk_create(
+    collection: str,
+    request: Request,
+    chunk_size: Annotated[int, Query(ge=1, le=10000)] = BULK_CHUNK_SIZE,
+):
+    if collection not in BULK_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Not found")
+    collection_name, model = BULK_COLLECTIONS[collection]
+    items = await read_bulk_items(request)
+
+    results = [None] * len(items)
+    valid, positions = [], []
+    for i, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            valid.append(model.model_validate(item))
+            positions.append(i)
+        except (ValidationError, ValueError) as e:
+            results[i] = {"index": i, "error": str(e)[:500]}
+
+    if valid:
+        if async_db is None:
+            raise HTTPException(status_code=503, detail="Database not available")
+        if collection_name == "order":
+            valid = await denormalize.snapshot([v.model_dump() for v in valid])
+        written = await acreate_documents(collection_name, valid, chunk_size=chunk_size)
+        for i, outcome in zip(positions, written):
+            results[i] = {"index": i, **outcome}
+        if collection_name == "order":
+            await apply_order_changes([], [
+                {**v, "_id": outcome["id"]} for v, outcome in zip(valid, written) if "id" in outcome
+            ])
+
+    inserted = sum(1 for r in results if "id" in r)
+    return {"inserted": inserted, "failed": len(results) - inserted, "results": results}
+
+# Streaming imports: POST /{collection}/import with a CSV or NDJSON body. The body
+# is parsed as it arrives and each batch is awaited into Mongo before reading on,
+# so a slow database pushes back on the upload instead of buffering it.
+IMPORT_COLLECTIONS = {"customers": ("customer", Customer), "products": ("product", Product)}
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+MAX_REPORTED_ERRORS = 100
+# A quoted CSV field may span lines, but not without bound
+MAX_CSV_RECORD_CHARS = int(os.getenv("MAX_CSV_RECORD_CHARS", 1_000_000))
+
+async def iter_lines(request: Request):
+    """Decoded lines (newline kept) from the request body stream
+
+    Only LF ends a line (a CR before it stays on the line); str.splitlines would
+    also split on U+2028, U+0085 and the \\x1c-\\x1e separators, which can
+    appear inside values.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def iter_ndjson_rows(request: Request):
+    async for line in iter_lines(request):
+        if line.strip():
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                yield e
+
+def csv_quote_open(line: str, in_quotes: bool = False) -> bool:
+    """Whether a CSV record is still inside a quoted field after `line`
+
+    Follows the csv module's default dialect: a quote only opens a field at its
+    start (so 27" in an unquoted field is literal) and "" inside quotes is an
+    escaped quote.
+    """
+    field_start, quote_closed = not in_quotes, False
+    for ch in line:
+        if in_quotes:
+            if ch == '"':
+                in_quotes, quote_closed = False, True
+            continue
+        if ch == '"' and (field_start or quote_closed):
+            in_quotes = True
+        field_start, quote_closed = ch == ",", False
+    return in_quotes
+
+async def parse_csv_rows(lines):
+    """Rows as dicts keyed by the header from an async iterable of lines; empty cells are left out"""
+    header = None
+    record = ""
+    in_quotes = False
+    async for line in lines:
+        record += line
+        if in_quotes or '"' in line:
+            in_quotes = csv_quote_open(line, in_quotes)
+        if in_quotes:
+            if len(record) > MAX_CSV_RECORD_CHARS:
+                yield ValueError("Quoted field too long (unterminated quote?)")
+                record, in_quotes = "", False
+            continue
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not values:
+            continue
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        yield {k: v for k, v in zip(header, values) if v != ""}
+    if record.strip():
+        yield ValueError("Unterminated quoted field")
+
+def iter_csv_rows(request: Request):
+    """Rows as dicts keyed by the header; empty cells are left out so schema defaults apply"""
+    return parse_csv_rows(iter_lines(request))
+
+@app.post("/{collection}/import")
+async def import_documents(
+    collection: str,
+    request: Request,
+    batch_size: Annotated[int, Query(ge=1, le=10000)] = IMPORT_BATCH_SIZE,
+):
+    if collection not in IMPORT_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Not found")
+    if async_db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    collection_name, model = IMPORT_COLLECTIONS[collection]
+    content_type = request.headers.get("content-type", "")
+    if NDJSON_MEDIA_TYPE in content_type:
+        rows = iter_ndjson_rows(request)
+    elif "text/csv" in content_type:
+        rows = iter_csv_rows(request)
+    else:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson")
+
+    summary = {"inserted": 0, "rejected": 0, "errors": []}
+
+    def reject(row_number: int, error: str):
+        summary["rejected"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"row": row_number, "error": error[:500]})
+
+    async def flush(batch):
+        written = await acreate_documents(collection_name, [doc for _, doc in batch], chunk_size=batch_size)
+        for (row_number, _), outcome in zip(batch, written):
+            if "id" in outcome:
+                summary["inserted"] += 1
+            else:
+                reject(row_number, outcome["error"])
+
+    batch = []
+    row_number = 0
+    async for row in rows:
+        row_number += 1
+        try:
+            if isinstance(row, Exception):
+                raise row
+            batch.append((row_number, model.model_validate(row)))
+        except (ValidationError, ValueError) as e:
+            reject(row_number, str(e))
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    return summary
+
+# Bulk updates/deletes: one bulk_write of UpdateOne/DeleteOne ops per request
+class BulkPatch(BaseModel):
+    id: str
+    patch: dict
+
+class BulkDelete(BaseModel):
+    ids: List[str]
+
+# Order fields that feed the sales rollup
+ROLLUP_FIELDS = {"items", "order_date"}
+
+_field_adapters = {}
+
+def validate_patch(model, patch: dict) -> dict:
+    """Validate a partial update against the schema's field types and constraints"""
+    clean = {}
+    for name, value in patch.items():
+        field = model.model_fields.get(name)
+        if field is None:
+            raise ValueError(f"Unknown field: {name}")
+        adapter = _field_adapters.get((model, name))
+        if adapter is None:
+            annotation = Annotated[(field.annotation, *field.metadata)] if field.metadata else field.annotation
+            adapter = _field_adapters[(model, name)] = TypeAdapter(annotation)
+        clean[name] = adapter.dump_python(adapter.validate_python(value))
+    return clean
+
+async def previous_orders(ids: List[str]) -> dict:
+    return {str(d["_id"]): d for d in await aget_documents_by_ids("order", ids)}
+
+@app.patch("/{collection}/bulk")
+async def bulk_update(collection: str, payload: List[BulkPatch], background_tasks: BackgroundTasks):
+    if collection not in BULK_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Not found")
+    if async_db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    collection_name, model = BULK_COLLECTIONS[collection]
+
+    updates, failed = [], []
+    for i, item in enumerate(payload):
+        try:
+            if not ObjectId.is_valid(item.id):
+                raise ValueError("Invalid ObjectId")
+            updates.append((item.id, validate_patch(model, item.patch)))
+        except (ValidationError, ValueError) as e:
+            failed.append({"index": i, "id": item.id, "error": str(e)[:500]})
+    if not updates:
+        return {"matched": 0, "modified": 0, "failed": failed}
+
+    if collection_name == "order":
+        await denormalize.snapshot([data for _, data in updates])
+    touches_rollup = collection_name == "order" and any(ROLLUP_FIELDS & data.keys() for _, data in updates)
+    previous = await previous_orders([i for i, _ in updates]) if touches_rollup else {}
+    result = await aupdate_documents(collection_name, updates)
+    if touches_rollup:
+        await apply_order_changes(
+            list(previous.values()), [{**previous[i], **data} for i, data in updates if i in previous]
+        )
+    if collection_name == "customer":
+        background_tasks.add_task(denormalize.propagate_customers, updates)
+    return {"matched": result.matched_count, "modified": result.modified_count, "failed": failed}
+
+@app.post("/{collection}/bulk/delete")
+async def bulk_delete(collection: str, payload: BulkDelete):
+    if collection not in BULK_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Not found")
+    if async_db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    collection_name, _ = BULK_COLLECTIONS[collection]
+
+    ids = [i for i in payload.ids if ObjectId.is_valid(i)]
+    failed = [{"id": i, "error": "Invalid ObjectId"} for i in payload.ids if not ObjectId.is_valid(i)]
+    if not ids:
+        return {"deleted": 0, "failed": failed}
+
+    previous = await previous_orders(ids) if collection_name == "order" else {}
+    result = await adelete_documents(collection_name, ids)
+    if collection_name == "order":
+        await apply_order_changes(list(previous.values()), [])
+    return {"deleted": result.deleted_count, "failed": failed}
+
 # Analytics endpoint
+# Repeat dashboard queries are served from memory; any write to orders or the rollups clears it
+analytics_cache = TTLCache(
+    maxsize=int(os.getenv("ANALYTICS_CACHE_SIZE", 256)),
+    ttl=float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", 30)),
+)
+analytics_flight = SingleFlight()
+ANALYTICS_SOURCES = {"order", rollups.DAILY, rollups.DAILY_CATEGORY, rollups.STATE}
+
+def invalidate_analytics(collection_name: str, operation: str):
+    if collection_name in ANALYTICS_SOURCES:
+        analytics_cache.clear()
+
+register_write_hook(invalidate_analytics)
+
 class AnalyticsResponse(BaseModel):
     total_sales: float
     orders_count: int
@@ -247,65 +960,117 @@ class AnalyticsResponse(BaseModel):
     top_categories: List[dict]
     trend: List[dict]
 
+def build_analytics_response(total_sales: float, orders_count: int, cat_map: dict, trend_map: dict):
+    avg_order_value = round(total_sales / orders_count, 2) if orders_count else 0.0
+    # Top categories
+    top_categories = sorted([
+        {"category": k, "sales": round(v, 2)} for k, v in cat_map.items()
+    ], key=lambda x: x["sales"], reverse=True)[:TOP_CATEGORIES]
+    trend = [
+        {"date": d, "sales": round(s, 2)} for d, s in sorted(trend_map.items())
+    ]
+    return AnalyticsResponse(
+        total_sales=round(total_sales, 2),
+        orders_count=orders_count,
+        avg_order_value=avg_order_value,
+        top_categories=top_categories,
+        trend=trend,
+    )
+
+TOP_CATEGORIES = 5
+
+def overview_pipeline(filt: dict) -> list:
+    """Totals, top categories and daily trend for the matching orders as one $facet document
+
+    Order-level figures sum the stored total_amount, so only the category facet
+    unwinds items. A category filter keeps whole orders, as before: their totals
+    include every item. Orders without items count for nothing, like in the rollup.
+    """
+    has_items = {"$match": {"items.0": {"$exists": True}}}
+    return [
+        {"$match": filt},
+        {"$facet": {
+            "totals": [
+                has_items,
+                {"$group": {"_id": None, "sales": {"$sum": rollups.ORDER_TOTAL}, "orders": {"$sum": 1}}},
+            ],
+            "trend": [
+                has_items,
+                {"$group": {"_id": rollups.DAY, "sales": {"$sum": rollups.ORDER_TOTAL}}},
+                {"$sort": {"_id": 1}},
+            ],
+            "categories": [
+                {"$unwind": "$items"},
+                {"$group": {"_id": {"$ifNull": ["$items.category", "Unknown"]}, "sales": {"$sum": rollups.LINE_TOTAL}}},
+                {"$sort": {"sales": -1}},
+                {"$limit": TOP_CATEGORIES},
+            ],
+        }},
+    ]
+
+async def compute_overview(start: Optional[datetime], end: Optional[datetime], category: Optional[str]):
+    """Analytics for the range, or None when there is no database"""
+    if async_db is None:
+        return None
+
+    # Build filter for orders/sales
+    filt = {}
+    if start or end:
+        rng = {}
+        if start:
+            rng["$gte"] = start
+        if end:
+            rng["$lte"] = end
+        filt["order_date"] = rng
+    if category:
+        filt["items.category"] = category
+
+    # In-memory columns answer any range or category once loaded (ANALYTICS_ENGINE=columnar)
+    summary = columnar.overview(start, end, category)
+    if summary is not None:
+        return build_analytics_response(
+            summary["total_sales"], summary["orders_count"], summary["cat_map"], summary["trend_map"]
+        )
+
+    # Serve from the daily rollup when it can answer the range exactly
+    if not category and await rollups.is_covered(start, end):
+        summary = await rollups.overview(start, end)
+        return build_analytics_response(
+            summary["total_sales"], summary["orders_count"], summary["cat_map"], summary["trend_map"]
+        )
+
+    # Single pass over the matching orders; Mongo returns only the final numbers
+    facet = await async_db["order"].aggregate(overview_pipeline(filt)).to_list(None)
+    facet = facet[0] if facet else {}
+    totals = facet.get("totals") or [{}]
+    total_sales = float(totals[0].get("sales", 0))
+    orders_count = int(totals[0].get("orders", 0))
+    cat_map = {c["_id"]: float(c.get("sales", 0)) for c in facet.get("categories", [])}
+    trend_map = {d["_id"]: float(d.get("sales", 0)) for d in facet.get("trend", [])}
+    return build_analytics_response(total_sales, orders_count, cat_map, trend_map)
+
 @app.get("/analytics/overview", response_model=AnalyticsResponse)
-def analytics_overview(
+async def analytics_overview(
     start_date: Optional[str] = Query(None, description="ISO date"),
     end_date: Optional[str] = Query(None, description="ISO date"),
     category: Optional[str] = None,
 ):
-    # Build filter for orders/sales
     try:
-        filt = {}
-        if start_date or end_date:
-            rng = {}
-            if start_date:
-                rng["$gte"] = datetime.fromisoformat(start_date)
-            if end_date:
-                rng["$lte"] = datetime.fromisoformat(end_date)
-            filt["order_date"] = rng
-        if category:
-            filt["items.category"] = category  # if items were expanded with category
-
-        # Aggregate from orders collection
-        if db is not None:
-            pipeline = [
-                {"$match": filt},
-                {"$unwind": "$items"},
-                {"$addFields": {"line_total": {"$multiply": ["$items.quantity", "$items.price"]}}},
-                {"$group": {
-                    "_id": {
-                        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$order_date"}},
-                        "category": "$items.category"
-                    },
-                    "sales": {"$sum": "$line_total"},
-                    "orders": {"$addToSet": "$_id"}
-                }},
-            ]
-            rows = list(db["order"].aggregate(pipeline))
-            total_sales = float(sum(r.get("sales", 0) for r in rows))
-            orders_count = len({str(oid) for r in rows for oid in r.get("orders", [])})
-            avg_order_value = round(total_sales / orders_count, 2) if orders_count else 0.0
-            # Top categories
-            cat_map = {}
-            trend_map = {}
-            for r in rows:
-                cat = r["_id"].get("category") or "Unknown"
-                day = r["_id"].get("day")
-                cat_map[cat] = cat_map.get(cat, 0) + float(r.get("sales", 0))
-                trend_map[day] = trend_map.get(day, 0) + float(r.get("sales", 0))
-            top_categories = sorted([
-                {"category": k, "sales": round(v, 2)} for k, v in cat_map.items()
-            ], key=lambda x: x["sales"], reverse=True)[:5]
-            trend = [
-                {"date": d, "sales": round(s, 2)} for d, s in sorted(trend_map.items())
-            ]
-            return AnalyticsResponse(
-                total_sales=round(total_sales, 2),
-                orders_count=orders_count,
-                avg_order_value=avg_order_value,
-                top_categories=top_categories,
-                trend=trend,
-            )
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+        key = (start, end, category or None)
+        cached = analytics_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = analytics_cache.generation
+        # Identical concurrent requests share one computation; the generation keeps
+        # requests arriving after an order write from joining a pre-write computation
+        result = await analytics_flight.do(
+            (generation,) + key, lambda: compute_overview(start, end, category)
+        )
+        if result is not None:
+            analytics_cache.set(key, result, generation)
+            return result
     except Exception:
         pass
 
@@ -326,9 +1091,32 @@ def analytics_overview(
         trend=dummy_trend,
     )
 
+@app.get("/analytics/cache")
+async def analytics_cache_stats():
+    return {
+        **analytics_cache.stats(),
+        "single_flight": analytics_flight.stats(),
+        "products": denormalize.product_cache.stats(),
+    }
+
+@app.get("/analytics/engine")
+async def analytics_engine_stats():
+    return columnar.stats()
+
+@app.get("/ingest/stats")
+async def ingest_stats():
+    return ingest.stats()
+
+@app.get("/indexes")
+async def get_indexes():
+    try:
+        return await indexes.index_report()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=str(e)[:200])
+
 # Optional schemas endpoint for viewers
 @app.get("/schema")
-def get_schema():
+async def get_schema():
     return {
         "collections": [
             "user", "customer", "product", "order", "sale"
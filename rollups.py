@@ -0,0 +1,319 @@
+"""
+Daily Sales Rollups
+
+Pre-aggregated order totals used by /analytics/overview instead of scanning
+every order on each request. Two collections are maintained:
+
+- sales_daily: one document per day with total sales and order count
+- sales_daily_category: one document per day x category with sales and the
+  number of orders containing that category
+
+Order writes in main.py await apply_order()/apply_orders() with +1/-1 to keep
+both in step. rebuild() backfills everything from the raw orders
+(synchronously, meant for a background thread) and records the coverage in
+rollup_state; reads only use the rollup when the range is covered. Days that
+receive writes while a rebuild runs are recomputed once it has swapped in.
+If an incremental update fails, invalidate() drops the coverage (reads fall
+back to the raw pipeline) and rebuilds in the background.
+"""
+
+import logging
+import threading
+from datetime import datetime, time, timedelta, timezone
+from typing import Optional
+
+from pymongo import DeleteMany, DeleteOne, ReplaceOne, UpdateOne
+
+from database import db, async_db, abulk_write, bulk_write
+from indexes import INDEXES
+
+DAILY = "sales_daily"
+DAILY_CATEGORY = "sales_daily_category"
+STATE = "rollup_state"
+STATE_ID = "sales_daily"
+
+logger = logging.getLogger(__name__)
+
+# Stored line_total, or computed for orders written before it was (see denormalize.add_totals)
+LINE_TOTAL = {"$ifNull": ["$items.line_total", {"$multiply": ["$items.quantity", "$items.price"]}]}
+ORDER_TOTAL = {"$ifNull": ["$total_amount", {"$sum": {"$map": {
+    "input": "$items", "in": {"$multiply": ["$$this.quantity", "$$this.price"]},
+}}}]}
+DAY = {"$dateToString": {"format": "%Y-%m-%d", "date": "$order_date"}}
+
+
+def _utc(value: datetime) -> datetime:
+    """Naive UTC datetime, as BSON dates are stored (naive values are taken as UTC)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def order_day(order_date: datetime) -> str:
+    """Day bucket (UTC) matching $dateToString "%Y-%m-%d" on the stored date"""
+    if order_date.tzinfo is not None:
+        order_date = order_date.astimezone(timezone.utc)
+    return order_date.strftime("%Y-%m-%d")
+
+
+def order_contributions(order: dict):
+    """Return (day, {category: sales}) for an order, or None if it has no items"""
+    items = order.get("items") or []
+    if not items or not order.get("order_date"):
+        return None
+    by_category = {}
+    for item in items:
+        category = item.get("category")
+        line_total = item.get("line_total")
+        if line_total is None:
+            line_total = (item.get("quantity") or 0) * (item.get("price") or 0)
+        by_category[category] = by_category.get(category, 0) + line_total
+    return order_day(order["order_date"]), by_category
+
+
+async def apply_orders(orders: list, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) the orders' contributions, in one bulk write per rollup"""
+    if async_db is None:
+        return
+    daily = {}
+    daily_category = {}
+    for order in orders:
+        contrib = order_contributions(order) if order else None
+        if contrib is None:
+            continue
+        day, by_category = contrib
+        sales, count = daily.get(day, (0, 0))
+        daily[day] = (sales + sum(by_category.values()), count + 1)
+        for category, category_sales in by_category.items():
+            sales, count = daily_category.get((day, category), (0, 0))
+            daily_category[(day, category)] = (sales + category_sales, count + 1)
+    if daily:
+        await abulk_write(DAILY, [
+            UpdateOne({"_id": day}, {"$inc": {"sales": sign * sales, "orders": sign * count}}, upsert=True)
+            for day, (sales, count) in daily.items()
+        ])
+    if daily_category:
+        await abulk_write(DAILY_CATEGORY, [
+            UpdateOne(
+                {"day": day, "category": category},
+                {"$inc": {"sales": sign * sales, "orders": sign * count}},
+                upsert=True,
+            )
+            for (day, category), (sales, count) in daily_category.items()
+        ])
+    # Noted after the writes, so a rebuild recomputes these days after seeing them
+    _note_days(daily)
+
+
+async def apply_order(order: Optional[dict], sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) an order's contribution to the rollups"""
+    await apply_orders([order], sign)
+
+
+def _rollup_pipelines(match: dict):
+    """(per day x category, per day) aggregations over the orders matching `match`"""
+    base = [
+        {"$match": match},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {
+                "order": "$_id",
+                "day": DAY,
+                "category": "$items.category",
+            },
+            "sales": {"$sum": LINE_TOTAL},
+        }},
+    ]
+    by_category = base + [
+        {"$group": {
+            "_id": {"day": "$_id.day", "category": "$_id.category"},
+            "sales": {"$sum": "$sales"},
+            "orders": {"$sum": 1},
+        }},
+        {"$project": {"_id": 0, "day": "$_id.day", "category": "$_id.category", "sales": 1, "orders": 1}},
+    ]
+    by_day = base + [
+        {"$group": {"_id": {"order": "$_id.order", "day": "$_id.day"}, "sales": {"$sum": "$sales"}}},
+        {"$group": {"_id": "$_id.day", "sales": {"$sum": "$sales"}, "orders": {"$sum": 1}}},
+    ]
+    return by_category, by_day
+
+
+# Days that apply_orders() touched while a rebuild was running (None when none is).
+# The rebuild recomputes them after the swap, since those $inc updates went to the
+# collections being replaced. Only writes made by this process are tracked.
+_touched_days = None
+_touched_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+_rebuild_scheduled = False
+
+
+def _note_days(days):
+    with _touched_lock:
+        if _touched_days is not None:
+            _touched_days.update(days)
+
+
+def _take_touched_days() -> set:
+    """Days touched since the last call; stops tracking once there are none"""
+    global _touched_days
+    with _touched_lock:
+        days = _touched_days
+        _touched_days = set() if days else None
+        return days or set()
+
+
+def _recompute_days(days: set):
+    """Replace the rollup documents of the given days with fresh aggregates
+
+    Rows are replaced in place and only then are leftovers deleted, so readers
+    never see one of these days missing.
+    """
+    bounds = [datetime.fromisoformat(day) for day in sorted(days)]
+    match = {"$or": [{"order_date": {"$gte": lo, "$lt": lo + timedelta(days=1)}} for lo in bounds]}
+    by_category, by_day = _rollup_pipelines(match)
+    categories = {day: [] for day in days}
+    ops = []
+    for row in db["order"].aggregate(by_category, allowDiskUse=True):
+        categories[row["day"]].append(row.get("category"))
+        ops.append(ReplaceOne({"day": row["day"], "category": row.get("category")}, row, upsert=True))
+    ops += [DeleteMany({"day": day, "category": {"$nin": present}}) for day, present in categories.items()]
+    bulk_write(DAILY_CATEGORY, ops, ordered=True)
+    found = set()
+    ops = []
+    for row in db["order"].aggregate(by_day, allowDiskUse=True):
+        found.add(row["_id"])
+        ops.append(ReplaceOne({"_id": row["_id"]}, row, upsert=True))
+    ops += [DeleteMany({"_id": {"$in": list(days - found)}})]
+    bulk_write(DAILY, ops, ordered=True)
+
+
+def rebuild():
+    """Recompute both rollups from the orders collection and mark them as covering all days
+
+    The aggregates are written to scratch collections and renamed over the live
+    ones, so readers never see a half-built rollup. Concurrent rebuilds run one
+    after the other. The final rollup_state write goes through the write hooks,
+    so cached analytics computed from the old rollups are dropped.
+    """
+    if db is None:
+        return
+    with _rebuild_lock:
+        _rebuild()
+
+
+def _rebuild():
+    global _touched_days
+    with _touched_lock:
+        _touched_days = set()
+    try:
+        for name, pipeline in zip((DAILY_CATEGORY, DAILY), _rollup_pipelines({})):
+            scratch = f"{name}_rebuild"
+            db[scratch].drop()
+            # Created up front so an empty aggregate still has something to rename
+            db.create_collection(scratch)
+            if name in INDEXES:
+                db[scratch].create_indexes(INDEXES[name])
+            db["order"].aggregate(pipeline + [{"$out": scratch}], allowDiskUse=True)
+            db[scratch].rename(name, dropTarget=True)
+        # Catch up with order writes that landed in the replaced collections;
+        # recomputing can race with newer writes, so repeat until none came in
+        while True:
+            days = _take_touched_days()
+            if not days:
+                break
+            _recompute_days(days)
+    finally:
+        with _touched_lock:
+            _touched_days = None
+    bulk_write(STATE, [UpdateOne(
+        {"_id": STATE_ID},
+        {"$set": {"covered_from": "", "built_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )])
+
+
+def ensure_built():
+    """Build the rollups once if they have never been backfilled"""
+    if db is not None and db[STATE].find_one({"_id": STATE_ID}) is None:
+        rebuild()
+
+
+def _scheduled_rebuild():
+    global _rebuild_scheduled
+    try:
+        with _rebuild_lock:
+            with _touched_lock:
+                _rebuild_scheduled = False
+            # A rebuild that was running may have re-marked the rollups as covered
+            bulk_write(STATE, [DeleteOne({"_id": STATE_ID})])
+            _rebuild()
+    except Exception:
+        logger.exception("Rollup rebuild failed; analytics stay on the raw pipeline")
+
+
+def schedule_rebuild():
+    """Rebuild in a background thread, once, after any rebuild already running"""
+    global _rebuild_scheduled
+    if db is None:
+        return
+    with _touched_lock:
+        if _rebuild_scheduled:
+            return
+        _rebuild_scheduled = True
+    threading.Thread(target=_scheduled_rebuild, daemon=True).start()
+
+
+async def invalidate():
+    """Stop serving reads from the rollups and rebuild them (after a failed update)"""
+    try:
+        await abulk_write(STATE, [DeleteOne({"_id": STATE_ID})])
+    except Exception:
+        logger.exception("Could not drop rollup coverage")
+    schedule_rebuild()
+
+
+async def is_covered(start: Optional[datetime], end: Optional[datetime]) -> bool:
+    """True when [start, end] aligns to whole days the rollup has been backfilled for"""
+    if async_db is None:
+        return False
+    state = await async_db[STATE].find_one({"_id": STATE_ID})
+    if state is None:
+        return False
+    # Day buckets are UTC days and cannot answer ranges that cut one in half
+    start = _utc(start) if start is not None else None
+    end = _utc(end) if end is not None else None
+    if start is not None and start.time() != time.min:
+        return False
+    if end is not None and end.time() < time(23, 59, 59, 999000):
+        return False
+    return start is None or order_day(start) >= state.get("covered_from", "")
+
+
+async def overview(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    """Totals, top categories and daily trend for [start, end] read from the rollups"""
+    day_range = {}
+    if start is not None:
+        day_range["$gte"] = order_day(start)
+    if end is not None:
+        day_range["$lte"] = order_day(end)
+
+    days = await async_db[DAILY].find({"_id": day_range} if day_range else {}).sort("_id", 1).to_list(None)
+    total_sales = float(sum(d.get("sales", 0) for d in days))
+    orders_count = int(sum(d.get("orders", 0) for d in days))
+
+    categories = async_db[DAILY_CATEGORY].aggregate([
+        {"$match": {"day": day_range} if day_range else {}},
+        {"$group": {"_id": "$category", "sales": {"$sum": "$sales"}}},
+    ])
+    cat_map = {}
+    async for c in categories:
+        cat = c["_id"] or "Unknown"
+        cat_map[cat] = cat_map.get(cat, 0) + float(c.get("sales", 0))
+
+    return {
+        "total_sales": total_sales,
+        "orders_count": orders_count,
+        "cat_map": cat_map,
+        "trend_map": {d["_id"]: float(d.get("sales", 0)) for d in days if d.get("orders", 0) > 0},
+    }
@@ -45,6 +45,8 @@ class OrderItem(BaseModel):
     product_id: str
     quantity: int = Field(..., ge=1)
     price: float = Field(..., ge=0)
+    # Stored items also carry title, category and line_total; the server fills
+    # them in when the order is written (see denormalize.py), so they aren't inputs
 
 # Order schema
 class Order(BaseModel):
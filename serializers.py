@@ -0,0 +1,50 @@
+"""
+Response Serialization
+
+Mongo documents are encoded straight to JSON bytes with orjson. serialize_doc
+only renames _id to id and drops the internal `_search` field; every other
+BSON type (ObjectId, Decimal128, nested lists/dicts) is converted by orjson's
+`default` hook during the one encoding pass, and datetimes are handled
+natively in ISO format.
+
+Returning a DocumentResponse from an endpoint also skips FastAPI's
+jsonable_encoder walk over the payload.
+"""
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import ObjectId, Decimal128
+from fastapi.responses import JSONResponse
+
+
+def _default(obj: Any):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+def serialize_doc(doc: dict):
+    """Expose _id as a string id and drop internal fields; mutates and returns the document"""
+    if not doc:
+        return doc
+    if "_id" in doc:
+        doc["id"] = str(doc.pop("_id"))
+    doc.pop("_search", None)
+    return doc
+
+
+class DocumentResponse(JSONResponse):
+    """JSON response rendered with orjson and the BSON-aware default hook"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
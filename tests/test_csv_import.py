@@ -0,0 +1,66 @@
+"""
+CSV import parser (main.parse_csv_rows). Pure parsing, no database needed:
+
+    python -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main  # noqa: E402
+
+
+async def _lines(text: str):
+    for line in text.splitlines(keepends=True):
+        yield line
+
+
+def parse(text: str) -> list:
+    async def collect():
+        return [row async for row in main.parse_csv_rows(_lines(text))]
+    return asyncio.run(collect())
+
+
+class ParseCsvRowsTest(unittest.TestCase):
+    def test_rows_keyed_by_header(self):
+        rows = parse("title, price\nA,1\nB,\n")
+        self.assertEqual(rows, [{"title": "A", "price": "1"}, {"title": "B"}])
+
+    def test_bare_quote_in_unquoted_field_is_literal(self):
+        rows = parse('title,price,category\nMonitor 27" IPS,199,displays\nCable,5,misc\nDesk,90,office\n')
+        self.assertEqual([r["title"] for r in rows], ['Monitor 27" IPS', "Cable", "Desk"])
+
+    def test_quoted_field_spans_lines(self):
+        rows = parse('title,description\nA,"two\nlines, with comma"\nB,x\n')
+        self.assertEqual(rows, [{"title": "A", "description": "two\nlines, with comma"}, {"title": "B", "description": "x"}])
+
+    def test_escaped_quotes_inside_quoted_field(self):
+        rows = parse('title,description\nA,"say ""hi""\nthere"\nB,x\n')
+        self.assertEqual(rows[0]["description"], 'say "hi"\nthere')
+        self.assertEqual(rows[1]["title"], "B")
+
+    def test_crlf_line_endings(self):
+        rows = parse('title,description\r\nA,"x\r\ny"\r\nB,z\r\n')
+        self.assertEqual(rows, [{"title": "A", "description": "x\r\ny"}, {"title": "B", "description": "z"}])
+
+    def test_unterminated_quote(self):
+        rows = parse('title,description\nA,"never closed\nB,x\n')
+        self.assertEqual(len(rows), 1)
+        self.assertIsInstance(rows[0], ValueError)
+
+    def test_overlong_quoted_field_is_rejected(self):
+        limit = main.MAX_CSV_RECORD_CHARS
+        main.MAX_CSV_RECORD_CHARS = 20
+        try:
+            rows = parse('title,description\nA,"' + "x\n" * 20 + '"\n')
+        finally:
+            main.MAX_CSV_RECORD_CHARS = limit
+        self.assertIsInstance(rows[0], ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()